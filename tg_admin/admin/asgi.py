@@ -5,12 +5,16 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Живая очередь модерации (SSE, news/live/events/) работает только под ASGI. Запуск из каталога tg_admin:
+
+    uvicorn admin.asgi:application --host 0.0.0.0 --port 8000 --workers 2
 """
 
 import os
 
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tg_admin.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'admin.settings')
 
 application = get_asgi_application()
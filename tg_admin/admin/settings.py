@@ -27,6 +27,9 @@ pg_user = os.getenv('POSTGRES_USER')
 pg_db = os.getenv('POSTGRES_DB')
 pg_password = os.getenv('POSTGRES_PASSWORD')
 
+# Токен для API синхронизации изменений (news/changes/), заголовок Authorization: Bearer <токен>
+SYNC_API_TOKEN = os.getenv('SYNC_API_TOKEN')
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
 
@@ -58,6 +61,8 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'news.audit.AuditMiddleware',
+    'news.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -107,6 +112,43 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# По умолчанию кэш в памяти процесса. При нескольких процессах/серверах укажите общий кэш,
+# например CACHE_BACKEND=django.core.cache.backends.redis.RedisCache и CACHE_LOCATION=redis://...,
+# иначе сессии, пользователи и права между запросами не кэшируются (см. ниже и news/permissions.py).
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'tg-admin'),
+    },
+    # Отдельный псевдоним для сессий (по умолчанию тот же бэкенд, что и у default)
+    'sessions': {
+        'BACKEND': os.getenv('SESSION_CACHE_BACKEND', os.getenv('CACHE_BACKEND',
+                                                               'django.core.cache.backends.locmem.LocMemCache')),
+        'LOCATION': os.getenv('SESSION_CACHE_LOCATION', os.getenv('CACHE_LOCATION', 'tg-admin-sessions')),
+    },
+}
+
+# Сессии: cached_db читает из кэша, пишет и в кэш, и в базу, и держит запись в кэше весь срок сессии
+# (SESSION_COOKIE_AGE, по умолчанию 2 недели). Выход сбрасывает запись только в кэше своего процесса,
+# поэтому с кэшем в памяти процесса сессия, из которой вышли в процессе A, продолжала бы работать
+# в процессе B. Кэш сессий обязан быть общим для всех процессов (Redis/Memcached через
+# SESSION_CACHE_BACKEND/SESSION_CACHE_LOCATION или CACHE_*); пока он в памяти процесса,
+# сессии читаются только из базы - на один запрос больше, зато выход действует сразу везде.
+SESSION_CACHE_ALIAS = 'sessions'
+if CACHES[SESSION_CACHE_ALIAS]['BACKEND'] == 'django.core.cache.backends.locmem.LocMemCache':
+    SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+else:
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+# Пользователь и его права кэшируются между запросами, только если кэш default общий для всех процессов
+# (news/auth_backends.py, news/permissions.py)
+AUTHENTICATION_BACKENDS = ['news.auth_backends.CachedModelBackend']
+AUTH_CACHE_TIMEOUT = int(os.getenv('AUTH_CACHE_TIMEOUT', 60))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -1,11 +1,26 @@
 from django.contrib import admin
-from .models import PostNews, TelegramChannel, UserChannelPermission
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
+from django.contrib.admin.views.main import ChangeList
+from .models import AuditEvent, PostNews, TelegramChannel, UserChannelPermission
 from django.utils.safestring import mark_safe
-from django.http import HttpResponseRedirect
+from django.http import Http404, HttpResponse, HttpResponseNotAllowed, HttpResponseRedirect, JsonResponse
 from django.contrib import messages
 from django import forms
 from django.shortcuts import render, redirect
+from django.db.models import BooleanField, ExpressionWrapper, Q
+from django.urls import reverse
 from django.utils import timezone
+from django.utils.html import format_html, format_html_join
+from .audit import record_on_commit
+from .fragments import row_fragments
+from .permissions import allowed_channel_ids, can_access_channel
+from .moderation import (LEASE_SECONDS, UNMODERATED, ModerationConflict, lease_next, peek_next, plan_slots,
+                         publish_many, publish_post, release_leases, renew_lease, skip_post)
+from .telegram_preview import get_preview, invalidate_preview, warm_previews
+from .views import live_events_available
+
+# Период обновления живой очереди, когда поток событий недоступен (WSGI или не PostgreSQL)
+LIVE_POLL_SECONDS = 10
 
 
 @admin.register(UserChannelPermission)
@@ -30,7 +45,7 @@ class PublishForm(forms.Form):
         required=False,
         widget=forms.DateTimeInput(attrs={'type': 'datetime-local'}),
         input_formats=['%Y-%m-%dT%H:%M'],  # формат для datetime-local без секунд
-        label='Время публикации (оставьте пустым для текущего времени)'
+        label='Не раньше (оставьте пустым для ближайшего свободного слота канала)'
     )
 
 
@@ -58,19 +73,64 @@ class PostNewsAdminForm(forms.ModelForm):  # Переименовали и из
         return instance
 
 
+class DuplicateListFilter(admin.SimpleListFilter):
+    # Помимо да/нет принимает id корня группы: ?duplicates=<id> показывает всю группу дубликатов
+    title = 'Дубликаты'
+    parameter_name = 'duplicates'
+
+    def lookups(self, request, model_admin):
+        return (
+            ('yes', 'Похоже на дубликат'),
+            ('no', 'Уникальные'),
+        )
+
+    def queryset(self, request, queryset):
+        value = self.value()
+        if value == 'yes':
+            return queryset.filter(signature__duplicate_of__isnull=False)
+        if value == 'no':
+            return queryset.filter(signature__duplicate_of__isnull=True)
+        if value and value.isdigit():
+            return queryset.filter(Q(pk=value) | Q(signature__duplicate_of=value))
+        return queryset
+
+
+def _image_content_type(data):
+    if data.startswith(b'\x89PNG'):
+        return 'image/png'
+    if data.startswith(b'GIF8'):
+        return 'image/gif'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    return 'image/jpeg'
+
+
+class PostNewsChangeList(ChangeList):
+    def get_queryset(self, request, exclude_parameters=None):
+        # Байты картинок списку не нужны: превью картинок берутся из кэша кусков строк,
+        # а промахи догружаются одним запросом в PostNewsAdmin._warm_fragments
+        return (
+            super().get_queryset(request, exclude_parameters)
+            .defer('image')
+            .annotate(has_image=ExpressionWrapper(Q(image__isnull=False), output_field=BooleanField()))
+        )
+
+
 print("admin.py с PostNewsAdmin загружен")
 
 
 class PostNewsAdmin(admin.ModelAdmin):
     form = PostNewsAdminForm
-    list_display = ['id', 'news_id', 'ai_text_short', 'image_preview', 'channel', 'post_time', 'is_post',
-                    'action_buttons']
-    readonly_fields = ['image_preview']
-    fields = ['news_id', 'channel', 'pars_text', 'ai_text', 'url_image', 'image_preview', 'image_file', 'is_post',
-              'post_time']
+    list_display = ['id', 'news_id', 'ai_text_short', 'telegram_status', 'duplicate_badge', 'image_preview',
+                    'channel_display', 'post_time', 'is_post', 'action_buttons']
+    list_select_related = ['channel', 'signature']
+    readonly_fields = ['image_preview', 'telegram_preview']
+    fields = ['news_id', 'channel', 'pars_text', 'ai_text', 'telegram_preview', 'url_image', 'image_preview',
+              'image_file', 'is_post', 'post_time']
     list_display_links = ['id', 'news_id']
     search_fields = ['ai_text', 'pars_text', 'news_id', 'channel__name', 'channel__channel_id']
-    list_filter = ['is_post', 'channel', 'post_time']  # Можно оставить, но queryset будет уже отфильтрован
+    list_filter = ['is_post', DuplicateListFilter, 'channel', 'post_time']  # Можно оставить, но queryset будет уже отфильтрован
+    actions = ['publish_to_slots']
 
     def get_queryset(self, request):
         print(f"⚠️ PostNewsAdmin.get_queryset вызван для пользователя: {request.user.username}")
@@ -79,11 +139,7 @@ class PostNewsAdmin(admin.ModelAdmin):
             print("[DEBUG] Суперпользователь, возвращаем все записи")
             return qs
 
-        allowed_channel_tg_ids = list(
-            UserChannelPermission.objects
-            .filter(user=request.user)
-            .values_list('channel__channel_id', flat=True)
-        )
+        allowed_channel_tg_ids = list(allowed_channel_ids(request.user))
         print(f"[DEBUG] Разрешённые channel_id для {request.user.username}: {allowed_channel_tg_ids}")
 
         filtered_qs = qs.filter(channel__channel_id__in=allowed_channel_tg_ids)
@@ -97,9 +153,7 @@ class PostNewsAdmin(admin.ModelAdmin):
                 try:
                     # Получаем объекты TelegramChannel, к которым у пользователя есть доступ
                     allowed_channels_qs = TelegramChannel.objects.filter(
-                        channel_id__in=UserChannelPermission.objects
-                        .filter(user=request.user)
-                        .values_list('channel__channel_id', flat=True)
+                        channel_id__in=allowed_channel_ids(request.user)
                     )
                     kwargs["queryset"] = allowed_channels_qs
                 except Exception as e:
@@ -115,7 +169,7 @@ class PostNewsAdmin(admin.ModelAdmin):
         if request.user.is_superuser:
             return True
         try:
-            return UserChannelPermission.objects.filter(user=request.user).exists()
+            return bool(allowed_channel_ids(request.user))
         except:
             return False
 
@@ -126,13 +180,10 @@ class PostNewsAdmin(admin.ModelAdmin):
             return True  # Контролируется через get_queryset
 
         # Для конкретного объекта новости, проверяем, есть ли у пользователя доступ к каналу этой новости
-        if obj.channel:  # Если у новости есть канал
+        if obj.channel_id:  # Если у новости есть канал
             try:
-                return UserChannelPermission.objects.filter(
-                    user=request.user,
-                    channel__channel_id=obj.channel.channel_id  # obj.channel - это экземпляр TelegramChannel
-                    # его поле channel_id - это фактический TG ID
-                ).exists()
+                # obj.channel_id - это фактический TG ID (ForeignKey на TelegramChannel.channel_id)
+                return can_access_channel(request.user, obj.channel_id)
             except:
                 return False
         return False  # Если у новости нет канала, не суперюзер не может ее менять (или другая логика)
@@ -144,35 +195,140 @@ class PostNewsAdmin(admin.ModelAdmin):
         if obj is None:
             return True  # Контролируется через get_queryset
 
-        if obj.channel:
+        if obj.channel_id:
             try:
-                return UserChannelPermission.objects.filter(
-                    user=request.user,
-                    channel__channel_id=obj.channel.channel_id
-                ).exists()
+                return can_access_channel(request.user, obj.channel_id)
             except:
                 return False
         return False
 
+    # Колонки списка, которые берутся из кэша кусков строк (news/fragments.py)
+    cached_fragments = ('ai_text_short', 'image_preview', 'channel', 'action_buttons')
+
+    def _fragment(self, obj, name, render):
+        fragments = getattr(obj, '_fragments', None)
+        if fragments is None:  # не страница списка: форма редактирования, живая очередь
+            return render(obj)
+        value = fragments.get(name)
+        if value is None:
+            value = fragments[name] = render(obj)
+            row_fragments.set(obj._fragment_keys[name], value)
+        return value
+
+    @staticmethod
+    def _permission_key(user):
+        if user.is_superuser:
+            return 'superuser'
+        return frozenset(user.get_all_permissions())
+
+    def _warm_fragments(self, request, posts):
+        # Все куски страницы достаются из кэша разом; для промахов картинки без кэша
+        # догружаются одним запросом, а не отдельным запросом на каждую строку
+        permission_key = self._permission_key(request.user)
+        keys = {
+            obj.pk: {name: (obj.pk, obj.version, permission_key, name) for name in self.cached_fragments}
+            for obj in posts
+        }
+        cached = row_fragments.get_many([key for row in keys.values() for key in row.values()])
+        need_image = []
+        for obj in posts:
+            obj._fragment_keys = keys[obj.pk]
+            obj._fragments = {name: cached[key] for name, key in obj._fragment_keys.items() if key in cached}
+            if 'image_preview' not in obj._fragments:
+                if obj.has_image:
+                    need_image.append(obj)
+                else:
+                    # Поле отложено: без явного None обращение к obj.image стоило бы запроса на строку
+                    obj.image = None
+        if need_image:
+            images = dict(PostNews.objects.filter(pk__in=[obj.pk for obj in need_image]).values_list('id', 'image'))
+            for obj in need_image:
+                obj.image = images.get(obj.pk)
+
     def ai_text_short(self, obj):
+        return self._fragment(obj, 'ai_text_short', self._render_ai_text_short)
+
+    ai_text_short.short_description = 'AI Text'
+
+    @staticmethod
+    def _render_ai_text_short(obj):
         if obj.ai_text:
             return (obj.ai_text[:75] + '...') if len(obj.ai_text) > 75 else obj.ai_text
         return "-"
 
-    ai_text_short.short_description = 'AI Text'
-
     def image_preview(self, obj):
+        return self._fragment(obj, 'image_preview', self._render_image_preview)
+
+    image_preview.short_description = 'Image'
+
+    @staticmethod
+    def _render_image_preview(obj):
         if obj.image:
             import base64
             img_base64 = base64.b64encode(obj.image).decode()
             return mark_safe(f'<img src="data:image/jpeg;base64,{img_base64}" width="150" />')
         return "-"
 
-    image_preview.short_description = 'Image'
+    def channel_display(self, obj):
+        return self._fragment(obj, 'channel', lambda post: str(post.channel) if post.channel else "-")
+
+    channel_display.short_description = 'Channel'
+    channel_display.admin_order_field = 'channel'
+
+    def _telegram_preview_for(self, obj):
+        # На странице списка превью уже прогреты пачкой в get_changelist_instance
+        preview = getattr(obj, '_tg_preview', None)
+        if preview is None:
+            preview = get_preview(obj.ai_text, bool(obj.image))
+        return preview
+
+    def telegram_status(self, obj):
+        preview = self._telegram_preview_for(obj)
+        problems = preview['errors'] + preview['warnings']
+        icon = '❌' if preview['errors'] else ('⚠️' if preview['warnings'] else '✅')
+        return format_html('<span title="{}">{} {}/{}</span>', '\n'.join(problems), icon,
+                           preview['length'], preview['limit'])
+
+    telegram_status.short_description = 'Telegram'
+
+    def duplicate_badge(self, obj):
+        signature = getattr(obj, 'signature', None)
+        if signature is None or signature.duplicate_of_id is None:
+            return "-"
+        return format_html('<a href="?duplicates={0}" title="Показать группу">≈ #{0}</a>', signature.duplicate_of_id)
+
+    duplicate_badge.short_description = 'Дубликат'
+
+    def telegram_preview(self, obj):
+        if obj is None or obj.pk is None:
+            return "-"
+        preview = self._telegram_preview_for(obj)
+        problems = format_html_join('', '<li style="color:#ba2121">{}</li>', ((e,) for e in preview['errors']))
+        problems += format_html_join('', '<li style="color:#a86b00">{}</li>', ((w,) for w in preview['warnings']))
+        # HTML превью собран из экранированного текста, поэтому его можно вставлять как есть
+        return format_html(
+            '<div style="max-width:480px;padding:8px 12px;border-radius:8px;background:#eef3f8;'
+            'white-space:pre-wrap">{}</div><p>Длина: {} из {}</p><ul>{}</ul>',
+            mark_safe(preview['html']), preview['length'], preview['limit'], problems,
+        )
+
+    telegram_preview.short_description = 'Превью в Telegram'
+
+    def get_changelist_instance(self, request):
+        cl = super().get_changelist_instance(request)
+        warm_previews(cl.result_list)
+        self._warm_fragments(request, cl.result_list)
+        return cl
+
+    def get_changelist(self, request, **kwargs):
+        return PostNewsChangeList
 
     def publish_view(self, request, pk):
-        # self.model здесь будет PostNews, так как PostNewsAdmin зарегистрирован с PostNews
-        obj = self.model.objects.get(pk=pk)
+        # Как ?publish=/?skip=: только посты из выдачи пользователя, чужие каналы - 404
+        try:
+            obj = self._get_moderated_object(request, pk)
+        except self.model.DoesNotExist:
+            raise Http404
 
         if request.method == 'POST':
             form = PublishForm(request.POST)  # PublishForm остается той же
@@ -181,10 +337,12 @@ class PostNewsAdmin(admin.ModelAdmin):
                 # Django >=4.0 DateTimeField/TimeField/DateField с `null=True` возвращают None если пусто,
                 # а не пустую строку, так что `or timezone.now()` должно работать.
                 # Для старых версий или если поле не null=True, может потребоваться проверка.
-                obj.post_time = post_time_data if post_time_data else timezone.now()
-                obj.is_post = True
-                obj.save()
-                self.message_user(request, f'Новость ID {obj.id} (news_id: {obj.news_id}) опубликована.')
+                try:
+                    publish_post(obj, post_time_data, user=request.user, require_unmoderated=True)
+                except ModerationConflict as e:
+                    self.message_user(request, str(e), level=messages.ERROR)
+                else:
+                    self.message_user(request, f'Новость ID {obj.id} (news_id: {obj.news_id}) опубликована.')
                 # URL должен соответствовать новому имени модели 'postnews'
                 # Имя приложения 'news' предполагается, измените если ваше другое
                 return redirect(f'/admin/news/postnews/')  # ИЛИ используйте reverse
@@ -202,6 +360,11 @@ class PostNewsAdmin(admin.ModelAdmin):
         return render(request, 'admin/publish_form.html', context)  # Шаблон может остаться тем же
 
     def action_buttons(self, obj):
+        return self._fragment(obj, 'action_buttons', self._render_action_buttons)
+
+    action_buttons.short_description = 'Действия'
+
+    def _render_action_buttons(self, obj):
         # Важно: URL-ы должны теперь указывать на 'postnews' вместо 'hockeynews'
         # Лучше использовать reverse для генерации URL, чтобы избежать хардкода
         # from django.urls import reverse
@@ -221,7 +384,187 @@ class PostNewsAdmin(admin.ModelAdmin):
             <a class="button" href="?skip={obj.pk}">⛔</a>
         ''')
 
-    action_buttons.short_description = 'Действия'
+    def _moderated_object_or_error(self, request, pk):
+        # Общая проверка для JSON-ручек живой очереди: объект должен быть в выдаче пользователя
+        obj = self.get_queryset(request).filter(pk=pk).first()
+        if obj is None:
+            return None, JsonResponse({'ok': False, 'error': f'Новость с PK {pk} не найдена.'}, status=404)
+        if not self.has_change_permission(request, obj):
+            return None, JsonResponse({'ok': False, 'error': 'Нет доступа к каналу этой новости.'}, status=403)
+        return obj, None
+
+    @staticmethod
+    def _post_json(obj):
+        return {'ok': True, 'id': obj.pk, 'news_id': obj.news_id, 'is_post': obj.is_post,
+                'post_time': obj.post_time.isoformat() if obj.post_time else None}
+
+    def publish_json_view(self, request, pk):
+        if request.method != 'POST':
+            return HttpResponseNotAllowed(['POST'])
+        obj, error = self._moderated_object_or_error(request, pk)
+        if error:
+            return error
+        form = PublishForm(request.POST)
+        if not form.is_valid():
+            return JsonResponse({'ok': False, 'errors': form.errors}, status=400)
+        try:
+            publish_post(obj, form.cleaned_data['post_time'], user=request.user, require_unmoderated=True)
+        except ModerationConflict as e:
+            return JsonResponse({'ok': False, 'error': str(e)}, status=409)
+        return JsonResponse(self._moderation_response(request, obj))
+
+    def skip_json_view(self, request, pk):
+        if request.method != 'POST':
+            return HttpResponseNotAllowed(['POST'])
+        obj, error = self._moderated_object_or_error(request, pk)
+        if error:
+            return error
+        try:
+            skip_post(obj, user=request.user, require_unmoderated=True)
+        except ModerationConflict as e:
+            return JsonResponse({'ok': False, 'error': str(e)}, status=409)
+        return JsonResponse(self._moderation_response(request, obj))
+
+    def _moderation_response(self, request, obj):
+        data = self._post_json(obj)
+        if request.POST.get('next'):
+            # Режим «следующая новость»: сразу отдаём следующий пост, без отдельного запроса
+            data.update(self._next_payload(request))
+        return data
+
+    def _live_queue(self, request):
+        # Неразобранные посты без картинок: image в очереди не нужен и тяжёлый
+        return (
+            self.get_queryset(request)
+            .filter(UNMODERATED)
+            .select_related('channel')
+            .defer('image', 'pars_text')
+            .order_by('-id')[:100]
+        )
+
+    def live_rows_view(self, request):
+        rows = [
+            {
+                'id': obj.pk,
+                'news_id': obj.news_id,
+                'channel': str(obj.channel) if obj.channel else None,
+                'text': self.ai_text_short(obj),
+            }
+            for obj in self._live_queue(request)
+        ]
+        return JsonResponse({'rows': rows})
+
+    def live_queue_view(self, request):
+        opts = self.model._meta
+        context = {
+            **self.admin_site.each_context(request),
+            'title': 'Очередь модерации',
+            'opts': opts,
+            'app_label': opts.app_label,
+            'live_events': live_events_available(request),
+            'poll_seconds': LIVE_POLL_SECONDS,
+        }
+        return render(request, 'admin/live_queue.html', context)
+
+    def _next_exclude(self, request):
+        # id постов, которые модератор уже пролистал в этой сессии «следующей новости»
+        return [int(pk) for pk in request.POST.get('exclude', '').split(',') if pk.isdigit()]
+
+    def _next_post_data(self, request, post_ids):
+        posts = (
+            self.get_queryset(request)
+            .filter(pk__in=post_ids)
+            .select_related('channel')
+            .defer('image')
+            .annotate(has_image=ExpressionWrapper(Q(image__isnull=False), output_field=BooleanField()))
+        )
+        by_id = {}
+        for obj in posts:
+            preview = get_preview(obj.ai_text, obj.has_image)
+            by_id[obj.pk] = {
+                'id': obj.pk,
+                'news_id': obj.news_id,
+                'channel': str(obj.channel) if obj.channel else None,
+                'html': preview['html'],
+                'length': preview['length'],
+                'limit': preview['limit'],
+                'problems': preview['errors'] + preview['warnings'],
+                'image_url': reverse('admin:postnews-image', args=[obj.pk]) if obj.has_image else None,
+                'change_url': reverse('admin:news_postnews_change', args=[obj.pk]),
+            }
+        return [by_id[pk] for pk in post_ids if pk in by_id]
+
+    def _next_payload(self, request):
+        queryset = self.get_queryset(request)
+        exclude = self._next_exclude(request)
+        post_id = lease_next(queryset, request.user, exclude)
+        if post_id is None:
+            return {'post': None, 'upcoming': []}
+        upcoming = peek_next(queryset, request.user, exclude + [post_id])
+        data = self._next_post_data(request, [post_id] + upcoming)
+        return {'post': data[0] if data else None, 'upcoming': data[1:]}
+
+    def next_post_view(self, request):
+        opts = self.model._meta
+        context = {
+            **self.admin_site.each_context(request),
+            'title': 'Следующая новость',
+            'opts': opts,
+            'app_label': opts.app_label,
+            'lease_seconds': LEASE_SECONDS,
+        }
+        return render(request, 'admin/next_post.html', context)
+
+    def next_post_json_view(self, request):
+        if request.method != 'POST':
+            return HttpResponseNotAllowed(['POST'])
+        return JsonResponse({'ok': True, **self._next_payload(request)})
+
+    def lease_renew_view(self, request, pk):
+        if request.method != 'POST':
+            return HttpResponseNotAllowed(['POST'])
+        return JsonResponse({'ok': renew_lease(pk, request.user)})
+
+    def lease_release_view(self, request, pk):
+        if request.method != 'POST':
+            return HttpResponseNotAllowed(['POST'])
+        return JsonResponse({'ok': bool(release_leases(request.user, post_id=pk))})
+
+    def image_view(self, request, pk):
+        # Отдельный URL картинки, чтобы браузер мог кэшировать и заранее подгружать её
+        image = self.get_queryset(request).filter(pk=pk).values_list('image', flat=True).first()
+        if not image:
+            return HttpResponse(status=404)
+        image = bytes(image)
+        response = HttpResponse(image, content_type=_image_content_type(image))
+        response['Cache-Control'] = 'private, max-age=3600'
+        return response
+
+    @admin.action(description='Опубликовать в ближайшие свободные слоты')
+    def publish_to_slots(self, request, queryset):
+        posts = list(queryset.filter(UNMODERATED).select_related('channel').defer('image').order_by('id'))
+        if request.POST.get('apply'):
+            published = publish_many([post.pk for post in posts], request.user)
+            self.message_user(request, f'Запланировано к публикации: {len(published)} из {len(posts)}.')
+            skipped = len(posts) - len(published)
+            if skipped:
+                self.message_user(request, f'Пропущено {skipped}: уже разобраны или их разбирает другой модератор.',
+                                  level=messages.WARNING)
+            return None
+
+        # Сначала показываем, как лягут посты, и только по подтверждению сохраняем
+        opts = self.model._meta
+        context = {
+            **self.admin_site.each_context(request),
+            'title': 'Расписание публикации',
+            'opts': opts,
+            'app_label': opts.app_label,
+            'plan': plan_slots(posts),
+            'selected': queryset.values_list('pk', flat=True),
+            'action': 'publish_to_slots',
+            'action_checkbox_name': ACTION_CHECKBOX_NAME,
+        }
+        return render(request, 'admin/schedule_preview.html', context)
 
     def get_urls(self):
         from django.urls import path
@@ -231,9 +574,35 @@ class PostNewsAdmin(admin.ModelAdmin):
         custom_urls = [
             path('publish/<int:pk>/', self.admin_site.admin_view(self.publish_view),
                  name=f'{self.model._meta.model_name}-publish'),
+            path('publish/<int:pk>/json/', self.admin_site.admin_view(self.publish_json_view),
+                 name=f'{self.model._meta.model_name}-publish-json'),
+            path('skip/<int:pk>/json/', self.admin_site.admin_view(self.skip_json_view),
+                 name=f'{self.model._meta.model_name}-skip-json'),
+            path('live/', self.admin_site.admin_view(self.live_queue_view),
+                 name=f'{self.model._meta.model_name}-live'),
+            path('live/rows/', self.admin_site.admin_view(self.live_rows_view),
+                 name=f'{self.model._meta.model_name}-live-rows'),
+            path('next/', self.admin_site.admin_view(self.next_post_view),
+                 name=f'{self.model._meta.model_name}-next'),
+            path('next/json/', self.admin_site.admin_view(self.next_post_json_view),
+                 name=f'{self.model._meta.model_name}-next-json'),
+            path('lease/<int:pk>/renew/', self.admin_site.admin_view(self.lease_renew_view),
+                 name=f'{self.model._meta.model_name}-lease-renew'),
+            path('lease/<int:pk>/release/', self.admin_site.admin_view(self.lease_release_view),
+                 name=f'{self.model._meta.model_name}-lease-release'),
+            path('image/<int:pk>/', self.admin_site.admin_view(self.image_view, cacheable=True),
+                 name=f'{self.model._meta.model_name}-image'),
         ]
         return custom_urls + urls
 
+    def _get_moderated_object(self, request, pk):
+        # Как и в JSON-ручках: только посты из выдачи пользователя и только каналы, к которым есть доступ.
+        # Чужой пост для пользователя «не найден», чтобы не раскрывать, что он существует
+        obj = self.get_queryset(request).filter(pk=pk).first() if str(pk).isdigit() else None
+        if obj is None or not self.has_change_permission(request, obj):
+            raise self.model.DoesNotExist
+        return obj
+
     def change_view(self, request, object_id, form_url='', extra_context=None):
         # Логика для 'publish' и 'skip' GET параметров
         # self.model здесь будет PostNews
@@ -241,11 +610,12 @@ class PostNewsAdmin(admin.ModelAdmin):
             # Используйте try-except для обработки случая, когда объект не найден
             try:
                 obj_pk = request.GET['publish']
-                obj = self.model.objects.get(pk=obj_pk)
-                obj.is_post = True
-                obj.post_time = obj.post_time or timezone.now()  # Публикуем сейчас, если время не было установлено
-                obj.save()
+                obj = self._get_moderated_object(request, obj_pk)
+                # Публикуем сейчас, если время не было установлено
+                publish_post(obj, user=request.user, require_unmoderated=True)
                 messages.success(request, f'Новость ID {obj.id} (news_id: {obj.news_id}) отмечена как опубликованная.')
+            except ModerationConflict as e:
+                messages.error(request, str(e))
             except self.model.DoesNotExist:
                 messages.error(request, f'Новость с PK {obj_pk} не найдена.')
             return HttpResponseRedirect(request.path.split('?')[0])  # Убираем GET параметры из URL для редиректа
@@ -253,11 +623,12 @@ class PostNewsAdmin(admin.ModelAdmin):
         if 'skip' in request.GET:
             try:
                 obj_pk = request.GET['skip']
-                obj = self.model.objects.get(pk=obj_pk)
-                obj.is_post = True  # или отдельное поле is_skipped, если есть
+                obj = self._get_moderated_object(request, obj_pk)
                 # При пропуске, возможно, не стоит менять post_time или ставить его в далекое будущее/прошлое
-                obj.save()
+                skip_post(obj, user=request.user, require_unmoderated=True)
                 messages.warning(request, f'Новость ID {obj.id} (news_id: {obj.news_id}) пропущена.')
+            except ModerationConflict as e:
+                messages.error(request, str(e))
             except self.model.DoesNotExist:
                 messages.error(request, f'Новость с PK {obj_pk} не найдена.')
             return HttpResponseRedirect(request.path.split('?')[0])
@@ -266,11 +637,35 @@ class PostNewsAdmin(admin.ModelAdmin):
 
     def save_model(self, request, obj, form, change):
         # obj здесь экземпляр PostNews
+        if change and ('ai_text' in form.changed_data or 'image_file' in form.changed_data):
+            invalidate_preview(form.initial.get('ai_text'))
+        publish = obj.is_post and 'is_post' in form.changed_data
+        if publish:
+            # Публикация галочкой в форме идёт через publish_post, как кнопка «Опубликовать»: пост получает
+            # свободный слот не раньше указанного времени, а бот - уведомление после COMMIT
+            obj.is_post = False
         obj.save()
+        record_on_commit('edit' if change else 'create', actor=request.user, post=obj, fields=form.changed_data)
+        if publish:
+            try:
+                publish_post(obj, user=request.user)
+            except ModerationConflict as e:
+                messages.error(request, str(e))
 
     def delete_model(self, request, obj):
         # obj здесь экземпляр PostNews
+        post_id, channel_tg_id = obj.pk, obj.channel_id
         obj.delete()
+        record_on_commit('delete', actor=request.user, post_id=post_id, channel_tg_id=channel_tg_id,
+                         news_id=obj.news_id)
+
+    def delete_queryset(self, request, queryset):
+        # Массовое удаление из списка: пишем по событию на каждую новость
+        deleted = list(queryset.values_list('id', 'channel_id', 'news_id'))
+        super().delete_queryset(request, queryset)
+        for post_id, channel_tg_id, news_id in deleted:
+            record_on_commit('delete', actor=request.user, post_id=post_id, channel_tg_id=channel_tg_id,
+                             news_id=news_id)
 
 
 # Регистрация новой модели и ее админ-класса
@@ -292,10 +687,7 @@ class TelegramChannelAdmin(admin.ModelAdmin):
         try:
             # Показываем только те каналы, к которым у пользователя есть разрешение
             # Мы фильтруем сами TelegramChannel по их полю channel_id
-            allowed_channel_tg_ids = UserChannelPermission.objects \
-                .filter(user=request.user) \
-                .values_list('channel__channel_id', flat=True)
-            return qs.filter(channel_id__in=list(allowed_channel_tg_ids))
+            return qs.filter(channel_id__in=list(allowed_channel_ids(request.user)))
         except Exception as e:
             print(f"Ошибка при получении разрешенных TelegramChannel: {e}")
             return qs.none()
@@ -311,10 +703,7 @@ class TelegramChannelAdmin(admin.ModelAdmin):
 
         # Пользователь может менять канал, если он ему разрешен
         try:
-            return UserChannelPermission.objects.filter(
-                user=request.user,
-                channel__channel_id=obj.channel_id  # obj.channel_id - это фактический TG ID канала
-            ).exists()
+            return can_access_channel(request.user, obj.channel_id)  # obj.channel_id - это фактический TG ID канала
         except:
             return False
 
@@ -325,10 +714,7 @@ class TelegramChannelAdmin(admin.ModelAdmin):
         if obj is None:
             return True
         try:
-            return UserChannelPermission.objects.filter(
-                user=request.user,
-                channel__channel_id=obj.channel_id
-            ).exists()
+            return can_access_channel(request.user, obj.channel_id)
         except:
             return False
 
@@ -339,3 +725,29 @@ class TelegramChannelAdmin(admin.ModelAdmin):
     def delete_model(self, request, obj):
         obj.delete()
 
+
+
+@admin.register(AuditEvent)
+class AuditEventAdmin(admin.ModelAdmin):
+    # Журнал только для чтения и только для суперпользователей
+    list_display = ('created_at', 'actor_name', 'action', 'post_id', 'channel_tg_id', 'details')
+    list_filter = ('action', 'created_at')
+    search_fields = ('actor_name', '=post_id', '=channel_tg_id')
+    date_hierarchy = 'created_at'
+    show_full_result_count = False  # COUNT(*) по всему журналу на каждой странице не нужен
+    list_per_page = 100
+
+    def has_module_permission(self, request):
+        return request.user.is_superuser
+
+    def has_view_permission(self, request, obj=None):
+        return request.user.is_superuser
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,158 @@
+import atexit
+import contextvars
+import threading
+from datetime import datetime, timezone as dt_timezone
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+
+from .models import AuditEvent
+
+# События копятся в памяти процесса и пишутся одной вставкой из фонового потока: сразу при наборе
+# FLUSH_SIZE штук или через FLUSH_INTERVAL секунд после первого события пачки, плюс при выходе.
+# Клик модератора платит только за добавление в список, а запись никогда не попадает в транзакцию запроса.
+FLUSH_SIZE = getattr(settings, 'AUDIT_FLUSH_SIZE', 100)
+FLUSH_INTERVAL = getattr(settings, 'AUDIT_FLUSH_INTERVAL', 5)
+# Если база недоступна, держим не больше стольких событий, чтобы не съесть память
+MAX_BUFFER = getattr(settings, 'AUDIT_MAX_BUFFER', 10000)
+
+_buffer = []
+_lock = threading.Lock()
+_timer = None
+_known_partitions = set()
+
+# Текущий запрос, чтобы сигналы (выдача прав и т.п.) знали, кто совершил действие
+_current_request = contextvars.ContextVar('audit_request', default=None)
+
+
+class AuditMiddleware:
+    # Умеет и sync, и async, чтобы не переводить в sync-режим асинхронный SSE-поток
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = _current_request.set(request)
+        try:
+            return self.get_response(request)
+        finally:
+            _current_request.reset(token)
+
+    async def __acall__(self, request):
+        token = _current_request.set(request)
+        try:
+            return await self.get_response(request)
+        finally:
+            _current_request.reset(token)
+
+
+def _current_actor():
+    request = _current_request.get()
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user
+    return None
+
+
+def record(action, actor=None, post=None, **details):
+    actor = actor or _current_actor()
+    event = AuditEvent(
+        created_at=timezone.now(),
+        actor_id=actor.pk if actor else None,
+        actor_name=actor.get_username() if actor else '',
+        action=action,
+        post_id=post.pk if post is not None else details.pop('post_id', None),
+        channel_tg_id=post.channel_id if post is not None else details.pop('channel_tg_id', None),
+        details=details,
+    )
+    global _timer
+    with _lock:
+        _buffer.append(event)
+        if len(_buffer) > MAX_BUFFER:
+            del _buffer[:len(_buffer) - MAX_BUFFER]
+        full = len(_buffer) >= FLUSH_SIZE
+        # Полный буфер пишем не здесь, а в фоновом потоке: record() могут вызвать внутри транзакции запроса,
+        # и при её откате пропали бы и чужие события из общего буфера
+        if _timer is None or (full and _timer.interval):
+            if _timer is not None:
+                _timer.cancel()
+            _timer = threading.Timer(0 if full else FLUSH_INTERVAL, _flush_in_background)
+            _timer.daemon = True
+            _timer.start()
+
+
+def record_on_commit(action, actor=None, post=None, **details):
+    # Для действий внутри транзакции: событие попадёт в буфер, только если транзакция закоммичена.
+    # Вне транзакции on_commit выполняется сразу
+    actor = actor or _current_actor()
+    transaction.on_commit(lambda: record(action, actor=actor, post=post, **details))
+
+
+def _partition_bounds(moment):
+    start = datetime(moment.year, moment.month, 1, tzinfo=dt_timezone.utc)
+    end = datetime(moment.year + moment.month // 12, moment.month % 12 + 1, 1, tzinfo=dt_timezone.utc)
+    return start, end
+
+
+def _ensure_partitions(events):
+    if connection.vendor != 'postgresql':
+        return
+    for event in events:
+        start, end = _partition_bounds(event.created_at.astimezone(dt_timezone.utc))
+        name = f'audit_log_y{start:%Y}m{start:%m}'
+        if name in _known_partitions:
+            continue
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS {name} PARTITION OF audit_log FOR VALUES FROM (%s) TO (%s)',
+                [start, end],
+            )
+        _known_partitions.add(name)
+
+
+def flush():
+    # Пишет буфер в отдельной транзакции; вызывается фоновым таймером и при выходе,
+    # не из обработчиков запросов
+    global _timer
+    with _lock:
+        events = _buffer[:]
+        _buffer.clear()
+        if _timer is not None:
+            _timer.cancel()
+            _timer = None
+    if not events:
+        return 0
+    try:
+        with transaction.atomic():
+            _ensure_partitions(events)
+            AuditEvent.objects.bulk_create(events)
+    except DatabaseError as e:
+        print(f"Ошибка записи журнала аудита: {e}")
+        with _lock:
+            # Вернём события в начало буфера, следующая попытка - со следующей пачкой
+            _buffer[:0] = events[-MAX_BUFFER:]
+        return 0
+    return len(events)
+
+
+def _flush_in_background():
+    global _timer
+    with _lock:
+        _timer = None
+    try:
+        flush()
+    finally:
+        # У потока таймера своё соединение с базой, не оставляем его висеть
+        connection.close()
+
+
+atexit.register(flush)
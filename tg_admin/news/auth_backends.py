@@ -0,0 +1,36 @@
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+from .permissions import CACHE_TIMEOUT, cache_is_shared, snapshot_key, user_key
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ModelBackend, который берёт пользователя и набор его прав из кэша, а не из базы на каждом запросе.
+    Сбрасывается сигналами при изменении пользователя, групп и прав (news/signals.py).
+    С кэшем в памяти процесса работает как обычный ModelBackend (см. news/permissions.py).
+    """
+
+    def get_user(self, user_id):
+        if not cache_is_shared():
+            return super().get_user(user_id)
+        key = user_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is None:
+                return None
+            cache.set(key, user, CACHE_TIMEOUT)
+        return user if self.user_can_authenticate(user) else None
+
+    def get_all_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None or not cache_is_shared():
+            return super().get_all_permissions(user_obj, obj)
+        if not hasattr(user_obj, '_perm_cache'):
+            key = snapshot_key('perms', user_obj.pk)
+            perms = cache.get(key)
+            if perms is None:
+                perms = super().get_all_permissions(user_obj)
+                cache.set(key, perms, CACHE_TIMEOUT)
+            user_obj._perm_cache = perms
+        return user_obj._perm_cache
@@ -0,0 +1,179 @@
+import hashlib
+import random
+import re
+from array import array
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from .models import PostNews, PostNewsLSHBucket, PostNewsSignature
+
+# MinHash из NUM_PERM значений, разбитый на BANDS полос по ROWS значений.
+# Два текста с похожестью Жаккара s попадают хотя бы в одну общую корзину с вероятностью
+# 1 - (1 - s ** ROWS) ** BANDS: при 16x4 это ~0.5 -> 64%, 0.7 -> 98%, 0.3 -> 12%.
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+MIN_SIMILARITY = getattr(settings, 'NEWS_DUPLICATE_MIN_SIMILARITY', 0.6)
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+# Параметры перестановок фиксированы сидом: сигнатуры в базе должны считаться одинаково во всех процессах
+_rng = random.Random(20250603)
+_PERMUTATIONS = [(_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME)) for _ in range(NUM_PERM)]
+
+_WORD_RE = re.compile(r'\w+', re.U)
+
+
+def _shingles(text):
+    words = _WORD_RE.findall((text or '').lower())
+    # Пары соседних слов учитывают порядок, одиночные слова спасают короткие тексты
+    return set(words) | {f'{a} {b}' for a, b in zip(words, words[1:])}
+
+
+def minhash(text):
+    shingles = _shingles(text)
+    if not shingles:
+        return None
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=4).digest(), 'big') for s in shingles]
+    # Для каждой из NUM_PERM перестановок - минимум по всем шинглам: NUM_PERM * len(shingles) умножений
+    return array('I', (min((a * h + b) % _MERSENNE_PRIME for h in hashes) & _MAX_HASH for a, b in _PERMUTATIONS))
+
+
+def band_keys(signature):
+    keys = []
+    for band in range(BANDS):
+        chunk = signature[band * ROWS:(band + 1) * ROWS]
+        digest = hashlib.blake2b(band.to_bytes(1, 'big') + chunk.tobytes(), digest_size=8).digest()
+        keys.append(int.from_bytes(digest, 'big', signed=True))
+    return keys
+
+
+def similarity(a, b):
+    return sum(x == y for x, y in zip(a, b)) / NUM_PERM
+
+
+def _load_signature(raw):
+    signature = array('I')
+    signature.frombytes(bytes(raw))
+    return signature
+
+
+def _post_text(pars_text, ai_text):
+    return pars_text or ai_text
+
+
+def index_rows(rows):
+    """
+    Индексирует пачку постов. rows - кортежи (id, pars_text, ai_text, channel_id) в порядке возрастания id.
+    Для каждого поста ищет кандидатов по корзинам (в базе и внутри пачки), проставляет duplicate_of
+    и сохраняет сигнатуры и корзины массовыми вставками. Возвращает число найденных дубликатов.
+    """
+    computed = []
+    for post_id, pars_text, ai_text, channel_id in rows:
+        signature = minhash(_post_text(pars_text, ai_text))
+        if signature is not None:
+            computed.append((post_id, channel_id, signature, band_keys(signature)))
+    if not computed:
+        return 0
+
+    post_ids = [post_id for post_id, _, _, _ in computed]
+    all_keys = {key for _, _, _, keys in computed for key in keys}
+    channels = {channel_id for _, channel_id, _, _ in computed}
+
+    channel_filter = Q(channel_tg_id__in=[c for c in channels if c is not None])
+    if None in channels:
+        channel_filter |= Q(channel_tg_id__isnull=True)
+
+    # Один запрос на всю пачку: все уже проиндексированные посты, попавшие в те же корзины
+    index = defaultdict(list)  # (channel, band_key) -> [post_id]
+    known = {}  # post_id -> (signature, group_id)
+    candidates = (
+        PostNewsLSHBucket.objects
+        .filter(band_key__in=all_keys)
+        .exclude(post_id__in=post_ids)
+        .filter(channel_filter)
+        .values_list('channel_tg_id', 'band_key', 'post_id')
+    )
+    for channel_id, key, post_id in candidates:
+        index[(channel_id, key)].append(post_id)
+        known[post_id] = None
+    for post_id, raw, group_id in (
+        PostNewsSignature.objects
+        .filter(post_id__in=list(known))
+        .values_list('post_id', 'minhash', 'duplicate_of_id')
+    ):
+        known[post_id] = (_load_signature(raw), group_id or post_id)
+
+    signatures = []
+    buckets = []
+    duplicates = 0
+    for post_id, channel_id, signature, keys in computed:
+        group_id = None
+        seen = set()
+        for key in keys:
+            for other_id in index[(channel_id, key)]:
+                if other_id in seen or known.get(other_id) is None:
+                    continue
+                seen.add(other_id)
+                other_signature, other_group = known[other_id]
+                if similarity(signature, other_signature) >= MIN_SIMILARITY:
+                    # Группа держится на самом раннем посте, так все дубликаты ссылаются на один корень
+                    group_id = other_group if group_id is None else min(group_id, other_group)
+        if group_id is not None:
+            duplicates += 1
+        known[post_id] = (signature, group_id or post_id)
+        for key in keys:
+            index[(channel_id, key)].append(post_id)
+            buckets.append(PostNewsLSHBucket(post_id=post_id, channel_tg_id=channel_id, band_key=key))
+        signatures.append(PostNewsSignature(post_id=post_id, channel_tg_id=channel_id,
+                                            minhash=signature.tobytes(), duplicate_of_id=group_id))
+
+    with transaction.atomic():
+        PostNewsLSHBucket.objects.filter(post_id__in=post_ids).delete()
+        PostNewsSignature.objects.filter(post_id__in=post_ids).delete()
+        PostNewsSignature.objects.bulk_create(signatures)
+        PostNewsLSHBucket.objects.bulk_create(buckets)
+    return duplicates
+
+
+def index_post(post):
+    """Инкрементальное обновление индекса для одного сохранённого поста."""
+    signature = minhash(_post_text(post.pars_text, post.ai_text))
+    stored = PostNewsSignature.objects.filter(post_id=post.pk).values_list('minhash', 'channel_tg_id').first()
+    if stored is not None and signature is not None and bytes(stored[0]) == signature.tobytes() \
+            and stored[1] == post.channel_id:
+        return  # текст и канал не менялись
+    if signature is None:
+        PostNewsLSHBucket.objects.filter(post_id=post.pk).delete()
+        PostNewsSignature.objects.filter(post_id=post.pk).delete()
+        return
+    index_rows([(post.pk, post.pars_text, post.ai_text, post.channel_id)])
+
+
+def index_new_posts(post_ids):
+    """Индексирует ещё не проиндексированные посты из post_ids (новые посты из уведомлений триггера)."""
+    rows = list(
+        PostNews.objects
+        .filter(pk__in=list(post_ids), signature__isnull=True)
+        .order_by('id')
+        .values_list('id', 'pars_text', 'ai_text', 'channel_id')
+    )
+    return index_rows(rows) if rows else 0
+
+
+def iter_unindexed_rows(batch_size=1000):
+    # Берём только нужные колонки: image (bytea) для сигнатур не нужен
+    qs = PostNews.objects.filter(signature__isnull=True).order_by('id')
+    last_id = 0
+    while True:
+        rows = list(
+            qs.filter(id__gt=last_id)
+            .values_list('id', 'pars_text', 'ai_text', 'channel_id')[:batch_size]
+        )
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        yield rows
@@ -0,0 +1,74 @@
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+# Кэш готовых HTML-кусков строк списка новостей в памяти процесса.
+# Ключ - (id поста, версия строки, набор прав пользователя, имя колонки): после любой записи в строку
+# триггер меняет version (см. миграцию 0007), и старые куски просто перестают находиться.
+# На других базах версия не ведётся, поэтому сохранённый пост ещё и сбрасывается сигналом (signals.py).
+# Память ограничена и числом кусков, и их суммарной длиной; вытесняются давно не использованные.
+MAX_ENTRIES = getattr(settings, 'NEWS_FRAGMENT_CACHE_ENTRIES', 5000)
+MAX_SIZE = getattr(settings, 'NEWS_FRAGMENT_CACHE_SIZE', 32 * 1024 * 1024)  # символов
+
+
+class FragmentCache:
+    def __init__(self, max_entries=MAX_ENTRIES, max_size=MAX_SIZE):
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._by_post = {}  # post_id -> ключи его кусков, чтобы сбрасывать пост без обхода всего кэша
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        found = {}
+        with self._lock:
+            for key in keys:
+                value = self._entries.get(key)
+                if value is None:
+                    self.misses += 1
+                    continue
+                self._entries.move_to_end(key)
+                self.hits += 1
+                found[key] = value
+        return found
+
+    def set(self, key, value):
+        size = len(value)
+        if size > self.max_size:
+            return
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = value
+            self._by_post.setdefault(key[0], set()).add(key)
+            self.size += size
+            while len(self._entries) > self.max_entries or self.size > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        value = self._entries.pop(key, None)
+        if value is None:
+            return
+        self.size -= len(value)
+        keys = self._by_post.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_post[key[0]]
+
+    def invalidate_post(self, post_id):
+        with self._lock:
+            for key in list(self._by_post.get(post_id, ())):
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_post.clear()
+            self.size = 0
+
+
+row_fragments = FragmentCache()
@@ -0,0 +1,124 @@
+import json
+import select
+import time
+from collections import OrderedDict
+
+from django.db import close_old_connections
+
+from .models import PostNews
+from .pg_notify import POST_PUBLISHED_CHANNEL, open_listen_connection
+from .views import after_cursor, parse_cursor, visible_version_limit
+
+
+class PublishedPostListener:
+    """
+    Клиент для бота: получает опубликованные посты через LISTEN/NOTIFY без опроса post_news.
+
+    handler(payload) вызывается с {"id", "channel", "post_time", "version"} на каждую публикацию поста
+    (и на перенос post_time опубликованного поста); version - published_version строки.
+    Правки текста уже опубликованного поста повторно не приходят.
+
+    Уведомления шлёт триггер (миграция 0010). Пропущенное за время обрыва или простоя процесса
+    догоняется одним проходом по индексу (published_version, id) после каждого (пере)подключения,
+    в паузах база не опрашивается. Курсор "version:id" передаётся в on_cursor(cursor) после догона
+    и после каждого уведомления; при следующем запуске его передают обратно в cursor.
+    Без сохранённого курсора слушатель начинает с текущего момента и историю не присылает.
+
+    handler должен быть идемпотентным по (id, version): после перезапуска могут повториться публикации,
+    шедшие одновременно с последней доставленной (курсор из уведомления сдвигается только до xmin).
+    """
+
+    def __init__(self, handler, cursor=None, on_cursor=None, reconnect_delay=1, idle_timeout=30,
+                 alias='default', seen_limit=10000, page_size=500):
+        self.handler = handler
+        self.cursor = parse_cursor(cursor) if cursor else None
+        self.on_cursor = on_cursor
+        self.reconnect_delay = reconnect_delay
+        self.idle_timeout = idle_timeout
+        self.alias = alias
+        self.seen_limit = seen_limit
+        self.page_size = page_size
+        self._seen = OrderedDict()
+
+    def _deliver(self, payload):
+        key = (payload['id'], payload['version'])
+        if key in self._seen:
+            return
+        self._seen[key] = True
+        if len(self._seen) > self.seen_limit:
+            self._seen.popitem(last=False)
+        self.handler(payload)
+
+    def _advance(self, cursor):
+        if self.cursor is not None and cursor <= self.cursor:
+            return
+        self.cursor = cursor
+        if self.on_cursor is not None:
+            self.on_cursor(f'{cursor[0]}:{cursor[1]}')
+
+    def catch_up(self):
+        close_old_connections()
+        visible_limit = visible_version_limit()
+        published = PostNews.objects.filter(published_version__isnull=False)
+        if visible_limit is not None:
+            published = published.filter(published_version__lt=visible_limit)
+        if self.cursor is None:
+            if visible_limit is not None:
+                self._advance((visible_limit, 0))
+            else:
+                last = published.order_by('-published_version', '-id').values_list('published_version', 'id').first()
+                self._advance(last or (0, 0))
+        while True:
+            rows = list(
+                after_cursor(published, *self.cursor, 'id', 'published_version')
+                .order_by('published_version', 'id')
+                .values_list('id', 'channel_id', 'post_time', 'published_version')[:self.page_size]
+            )
+            for post_id, channel_id, post_time, version in rows:
+                self._deliver({
+                    'id': post_id,
+                    'channel': channel_id,
+                    'post_time': post_time.isoformat() if post_time else None,
+                    'version': version,
+                })
+            # Курсор сохраняем только после того, как handler отработал по всей странице
+            if rows:
+                self._advance((rows[-1][3], rows[-1][0]))
+            if len(rows) < self.page_size:
+                break
+        if visible_limit is not None:
+            self._advance((visible_limit, 0))
+
+    def receive(self, payload):
+        # Все публикации с версией ниже xmin закоммичены раньше этой и уже пришли уведомлениями
+        xmin = payload.pop('xmin', None)
+        self._deliver(payload)
+        if xmin is not None:
+            self._advance((xmin, 0))
+
+    def listen(self):
+        conn = open_listen_connection([POST_PUBLISHED_CHANNEL], alias=self.alias)
+        try:
+            # Сначала LISTEN, потом догон: всё, что закоммитят после догона, придёт уведомлением
+            self.catch_up()
+            while True:
+                if select.select([conn], [], [], self.idle_timeout) == ([], [], []):
+                    # Тишина: проверяем, что соединение живо, иначе обрыв заметим только по TCP-таймауту
+                    with conn.cursor() as cursor:
+                        cursor.execute('SELECT 1')
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    self.receive(json.loads(conn.notifies.pop(0).payload))
+        finally:
+            conn.close()
+
+    def run_forever(self):
+        while True:
+            try:
+                self.listen()
+            except KeyboardInterrupt:
+                raise
+            except Exception as e:
+                print(f"Соединение LISTEN {POST_PUBLISHED_CHANNEL} потеряно: {e}")
+                time.sleep(self.reconnect_delay)
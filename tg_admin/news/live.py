@@ -0,0 +1,100 @@
+import asyncio
+import json
+import select
+import threading
+import time
+
+from .pg_notify import POST_EVENTS_CHANNEL, open_listen_connection
+
+HEARTBEAT_SECONDS = 15
+QUEUE_SIZE = 1000
+
+
+class PostEventHub:
+    """
+    Одно LISTEN-соединение на процесс, раздающее уведомления всем открытым SSE-потокам.
+    Поток-слушатель стартует с первым подписчиком и завершается, когда подписчиков не осталось,
+    так что открытые вкладки админки не опрашивают базу и не держат по соединению каждая.
+    """
+
+    def __init__(self, channel):
+        self.channel = channel
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        subscriber = (asyncio.get_running_loop(), queue)
+        with self._lock:
+            self._subscribers.add(subscriber)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f'listen-{self.channel}', daemon=True)
+                self._thread.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def _dispatch(self, payload):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(_put_nowait, queue, payload)
+
+    def _run(self):
+        conn = None
+        while True:
+            with self._lock:
+                if not self._subscribers:
+                    self._thread = None
+                    break
+            try:
+                if conn is None:
+                    conn = open_listen_connection([self.channel])
+                    # Пока соединения не было, события могли потеряться: просим клиентов перечитать очередь
+                    self._dispatch(json.dumps({'event': 'resync'}))
+                if select.select([conn], [], [], HEARTBEAT_SECONDS) != ([], [], []):
+                    conn.poll()
+                    while conn.notifies:
+                        self._dispatch(conn.notifies.pop(0).payload)
+            except Exception as e:
+                print(f"Ошибка LISTEN {self.channel}: {e}")
+                if conn is not None:
+                    conn.close()
+                    conn = None
+                time.sleep(1)
+        if conn is not None:
+            conn.close()
+
+
+def _put_nowait(queue, payload):
+    try:
+        queue.put_nowait(payload)
+    except asyncio.QueueFull:
+        pass  # медленный клиент; пропущенное он получит при следующем resync
+
+
+post_events = PostEventHub(POST_EVENTS_CHANNEL)
+
+
+async def iter_events(allowed_channels=None):
+    """Асинхронный генератор SSE-кадров; allowed_channels=None значит все каналы (суперпользователь)."""
+    subscriber = post_events.subscribe()
+    queue = subscriber[1]
+    try:
+        yield 'retry: 3000\n\n'
+        while True:
+            try:
+                payload = await asyncio.wait_for(queue.get(), timeout=HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ': ping\n\n'
+                continue
+            event = json.loads(payload)
+            if allowed_channels is not None and event.get('event') != 'resync' \
+                    and event.get('channel') not in allowed_channels:
+                continue
+            yield f"event: {event['event']}\ndata: {payload}\n\n"
+    finally:
+        post_events.unsubscribe(subscriber)
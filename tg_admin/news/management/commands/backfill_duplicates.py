@@ -0,0 +1,84 @@
+import json
+import select
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from news.duplicates import index_new_posts, iter_unindexed_rows, index_rows
+from news.models import PostNewsLSHBucket, PostNewsSignature
+from news.pg_notify import POST_EVENTS_CHANNEL, is_supported, open_listen_connection
+
+
+class Command(BaseCommand):
+    help = 'Строит MinHash-сигнатуры и LSH-корзины для постов, которых ещё нет в индексе дубликатов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--reset', action='store_true', help='Удалить индекс и построить его заново')
+        parser.add_argument('--watch', action='store_true',
+                            help='После догона не завершаться и индексировать новые посты по мере вставки')
+        parser.add_argument('--interval', type=int, default=30,
+                            help='Для --watch: период проверки соединения (PostgreSQL) или опроса (другие базы), сек')
+
+    def handle(self, *args, **options):
+        if options['reset']:
+            PostNewsLSHBucket.objects.all().delete()
+            PostNewsSignature.objects.all().delete()
+
+        self.backfill(options['batch_size'])
+        if options['watch']:
+            try:
+                self.watch(options['batch_size'], options['interval'])
+            except KeyboardInterrupt:
+                pass
+
+    def backfill(self, batch_size, verbose=True):
+        indexed = duplicates = 0
+        for rows in iter_unindexed_rows(batch_size=batch_size):
+            duplicates += index_rows(rows)
+            indexed += len(rows)
+            if verbose:
+                self.stdout.write(f'Обработано {indexed} постов, дубликатов: {duplicates}')
+        if verbose or indexed:
+            self.stdout.write(self.style.SUCCESS(f'Готово: {indexed} постов, дубликатов: {duplicates}'))
+
+    def watch(self, batch_size, interval):
+        if not is_supported():
+            # Без LISTEN/NOTIFY просто периодически догоняем непроиндексированные посты
+            while True:
+                time.sleep(interval)
+                close_old_connections()
+                self.backfill(batch_size, verbose=False)
+
+        # Парсер пишет в post_news мимо Django, о каждой вставке сообщает триггер post_news_notify_new
+        # (миграция 0003). После каждого (пере)подключения догоняем то, что вставили без нас.
+        while True:
+            conn = None
+            try:
+                conn = open_listen_connection([POST_EVENTS_CHANNEL])
+                close_old_connections()
+                self.backfill(batch_size, verbose=False)
+                while True:
+                    if select.select([conn], [], [], interval) == ([], [], []):
+                        with conn.cursor() as cursor:
+                            cursor.execute('SELECT 1')
+                        continue
+                    conn.poll()
+                    post_ids = set()
+                    while conn.notifies:
+                        event = json.loads(conn.notifies.pop(0).payload)
+                        if event.get('event') == 'new':
+                            post_ids.add(event['id'])
+                    if post_ids:
+                        close_old_connections()
+                        duplicates = index_new_posts(post_ids)
+                        self.stdout.write(f'Новых постов: {len(post_ids)}, дубликатов: {duplicates}')
+            except KeyboardInterrupt:
+                raise
+            except Exception as e:
+                self.stderr.write(f'Соединение LISTEN {POST_EVENTS_CHANNEL} потеряно: {e}')
+                time.sleep(1)
+            finally:
+                if conn is not None:
+                    conn.close()
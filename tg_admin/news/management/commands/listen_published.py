@@ -0,0 +1,60 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+from news.listener import PublishedPostListener
+from news.pg_notify import is_supported
+
+
+class Command(BaseCommand):
+    help = ('Слушает публикации постов (LISTEN post_news_published) и печатает их JSON-строками '
+            'или передаёт в --handler')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--handler', help='Путь к функции handler(payload), например bot.tasks.send_post')
+        parser.add_argument('--state-file',
+                            help='Файл, где хранится курсор: после перезапуска догоняются публикации за время '
+                                 'простоя. Без него слушатель начинает с текущего момента')
+
+    def handle(self, *args, **options):
+        if not is_supported():
+            self.stderr.write(self.style.ERROR('LISTEN/NOTIFY доступен только на PostgreSQL'))
+            return
+
+        if options['handler']:
+            handler = import_string(options['handler'])
+        else:
+            def handler(payload):
+                self.stdout.write(json.dumps(payload))
+                self.stdout.flush()
+
+        state_file = options['state_file']
+        listener = PublishedPostListener(
+            handler,
+            cursor=self._load_cursor(state_file) if state_file else None,
+            on_cursor=(lambda cursor: self._save_cursor(state_file, cursor)) if state_file else None,
+        )
+        try:
+            listener.run_forever()
+        except KeyboardInterrupt:
+            pass
+
+    @staticmethod
+    def _load_cursor(path):
+        try:
+            with open(path, encoding='utf-8') as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _save_cursor(path, cursor):
+        # Через временный файл и os.replace: при падении посреди записи останется прежний курсор
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(cursor)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.1 on 2026-10-19 10:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostNewsSignature',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='signature', serialize=False, to='news.postnews')),
+                ('channel_tg_id', models.BigIntegerField(blank=True, null=True)),
+                ('minhash', models.BinaryField()),
+                ('duplicate_of', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='news.postnews')),
+            ],
+            options={
+                'verbose_name': 'Сигнатура новости',
+                'verbose_name_plural': 'Сигнатуры новостей',
+                'db_table': 'post_news_signature',
+            },
+        ),
+        migrations.CreateModel(
+            name='PostNewsLSHBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('channel_tg_id', models.BigIntegerField(blank=True, null=True)),
+                ('band_key', models.BigIntegerField()),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lsh_buckets', to='news.postnews')),
+            ],
+            options={
+                'db_table': 'post_news_lsh_bucket',
+                'indexes': [models.Index(fields=['channel_tg_id', 'band_key'], name='post_news_lsh_lookup_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,50 @@
+from django.db import migrations
+
+# Новые посты обычно пишет парсер напрямую в post_news, мимо Django, поэтому
+# уведомление о них шлёт триггер. Публикация и пропуск уведомляют из news/moderation.py.
+CREATE_TRIGGER = """
+CREATE OR REPLACE FUNCTION post_news_notify_new() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('post_news_events', json_build_object(
+        'event', 'new',
+        'id', NEW.id,
+        'news_id', NEW.news_id,
+        'channel', NEW.channel_id,
+        'is_post', NEW.is_post,
+        'text', CASE WHEN length(NEW.ai_text) > 75 THEN left(NEW.ai_text, 75) || '...' ELSE NEW.ai_text END
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS post_news_notify_new ON post_news;
+CREATE TRIGGER post_news_notify_new
+    AFTER INSERT ON post_news
+    FOR EACH ROW EXECUTE FUNCTION post_news_notify_new();
+"""
+
+DROP_TRIGGER = """
+DROP TRIGGER IF EXISTS post_news_notify_new ON post_news;
+DROP FUNCTION IF EXISTS post_news_notify_new();
+"""
+
+
+def create_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_TRIGGER)
+
+
+def drop_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_TRIGGER)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0002_post_news_duplicate_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigger, drop_trigger),
+    ]
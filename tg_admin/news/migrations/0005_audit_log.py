@@ -0,0 +1,72 @@
+# Generated by Django 5.2.1 on 2026-10-19 11:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# На PostgreSQL журнал - секционированная по месяцам таблица: старые месяцы можно отсоединять
+# и удалять целиком, а свежие секции остаются маленькими. Секции на каждый месяц создаёт
+# news/audit.py перед вставкой; DEFAULT-секция ловит всё, что пришло мимо него.
+CREATE_PARTITIONED = """
+CREATE TABLE audit_log (
+    id bigint GENERATED BY DEFAULT AS IDENTITY,
+    created_at timestamp with time zone NOT NULL,
+    actor_id integer NULL,
+    actor_name varchar(150) NOT NULL,
+    action varchar(16) NOT NULL,
+    post_id bigint NULL,
+    channel_tg_id bigint NULL,
+    details jsonb NOT NULL,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+CREATE INDEX audit_log_created_at_brin ON audit_log USING brin (created_at);
+CREATE INDEX audit_log_actor_id_idx ON audit_log (actor_id);
+CREATE INDEX audit_log_post_id_idx ON audit_log (post_id);
+CREATE TABLE audit_log_default PARTITION OF audit_log DEFAULT;
+"""
+
+
+def create_audit_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_PARTITIONED)
+    else:
+        schema_editor.create_model(apps.get_model('news', 'AuditEvent'))
+
+
+def drop_audit_table(apps, schema_editor):
+    schema_editor.delete_model(apps.get_model('news', 'AuditEvent'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0004_post_news_lease'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='AuditEvent',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('created_at', models.DateTimeField()),
+                        ('actor_name', models.CharField(blank=True, max_length=150)),
+                        ('action', models.CharField(choices=[('create', 'Создание'), ('edit', 'Редактирование'), ('publish', 'Публикация'), ('skip', 'Пропуск'), ('delete', 'Удаление'), ('perm_add', 'Выдача доступа'), ('perm_change', 'Изменение доступа'), ('perm_remove', 'Отзыв доступа')], max_length=16)),
+                        ('post_id', models.BigIntegerField(blank=True, null=True)),
+                        ('channel_tg_id', models.BigIntegerField(blank=True, null=True)),
+                        ('details', models.JSONField(blank=True, default=dict)),
+                        ('actor', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+                    ],
+                    options={
+                        'verbose_name': 'Событие аудита',
+                        'verbose_name_plural': 'Журнал аудита',
+                        'db_table': 'audit_log',
+                        'ordering': ['-created_at'],
+                    },
+                ),
+            ],
+        ),
+        migrations.RunPython(create_audit_table, drop_audit_table),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-19 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0005_audit_log'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='telegramchannel',
+            name='min_post_interval',
+            field=models.PositiveIntegerField(default=0, verbose_name='Минимальный интервал между постами, мин'),
+        ),
+        migrations.AddField(
+            model_name='telegramchannel',
+            name='quiet_hours_end',
+            field=models.TimeField(blank=True, null=True, verbose_name='Тихие часы до'),
+        ),
+        migrations.AddField(
+            model_name='telegramchannel',
+            name='quiet_hours_start',
+            field=models.TimeField(blank=True, null=True, verbose_name='Тихие часы с'),
+        ),
+    ]
@@ -0,0 +1,108 @@
+# Generated by Django 5.2.1 on 2026-10-19 11:09
+
+from django.conf import settings
+from django.db import migrations, models
+
+# version = txid_current() транзакции, последней менявшей строку. В отличие от последовательности,
+# по нему можно безопасно читать изменения: всё, что записано транзакциями с txid меньше
+# txid_snapshot_xmin(), уже закоммичено, и новых строк с таким txid не появится (см. news/views.py).
+CREATE_TRIGGERS = """
+UPDATE post_news SET version = txid_current(), updated_at = now();
+
+CREATE OR REPLACE FUNCTION post_news_set_version() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE'
+        AND (NEW.news_id, NEW.pars_text, NEW.ai_text, NEW.url_image, NEW.is_post, NEW.post_time, NEW.channel_id)
+            IS NOT DISTINCT FROM
+            (OLD.news_id, OLD.pars_text, OLD.ai_text, OLD.url_image, OLD.is_post, OLD.post_time, OLD.channel_id)
+        AND NEW.image IS NOT DISTINCT FROM OLD.image
+    THEN
+        -- поменялись только служебные поля (аренда модератора): для потребителей это не изменение
+        NEW.version := OLD.version;
+        NEW.updated_at := OLD.updated_at;
+        RETURN NEW;
+    END IF;
+    NEW.version := txid_current();
+    NEW.updated_at := now();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS post_news_set_version ON post_news;
+CREATE TRIGGER post_news_set_version
+    BEFORE INSERT OR UPDATE ON post_news
+    FOR EACH ROW EXECUTE FUNCTION post_news_set_version();
+
+CREATE OR REPLACE FUNCTION post_news_tombstone() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO post_news_tombstone (post_id, channel_tg_id, version, deleted_at)
+    VALUES (OLD.id, OLD.channel_id, txid_current(), now());
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS post_news_tombstone ON post_news;
+CREATE TRIGGER post_news_tombstone
+    AFTER DELETE ON post_news
+    FOR EACH ROW EXECUTE FUNCTION post_news_tombstone();
+"""
+
+DROP_TRIGGERS = """
+DROP TRIGGER IF EXISTS post_news_set_version ON post_news;
+DROP FUNCTION IF EXISTS post_news_set_version();
+DROP TRIGGER IF EXISTS post_news_tombstone ON post_news;
+DROP FUNCTION IF EXISTS post_news_tombstone();
+"""
+
+
+def create_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_TRIGGERS)
+
+
+def drop_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_TRIGGERS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0006_telegram_channel_schedule'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostNewsTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('post_id', models.BigIntegerField()),
+                ('channel_tg_id', models.BigIntegerField(blank=True, null=True)),
+                ('version', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'post_news_tombstone',
+            },
+        ),
+        migrations.AddField(
+            model_name='postnews',
+            name='updated_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='postnews',
+            name='version',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='postnews',
+            index=models.Index(fields=['version', 'id'], name='post_news_version_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='postnewstombstone',
+            index=models.Index(fields=['version', 'post_id'], name='post_news_tombstone_ver_idx'),
+        ),
+        migrations.RunPython(create_triggers, drop_triggers),
+    ]
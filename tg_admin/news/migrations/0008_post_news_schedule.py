@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-19 11:22
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0007_post_news_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='postnews',
+            name='is_skipped',
+            field=models.BooleanField(db_default=False, default=False),
+        ),
+        migrations.AddIndex(
+            model_name='postnews',
+            index=models.Index(fields=['post_time'], name='post_news_post_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='postnews',
+            index=models.Index(fields=['channel', 'post_time'], name='post_news_channel_time_idx'),
+        ),
+    ]
@@ -0,0 +1,68 @@
+from django.db import migrations
+
+# 0008 добавила is_skipped, а триггер версии из 0007 сравнивал только старые колонки: пропуск поста
+# или публикация пропущенного с тем же post_time не меняли version и не доходили до потребителей
+SET_VERSION = """
+CREATE OR REPLACE FUNCTION post_news_set_version() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE'
+        AND (NEW.news_id, NEW.pars_text, NEW.ai_text, NEW.url_image, NEW.is_post, NEW.is_skipped, NEW.post_time,
+             NEW.channel_id)
+            IS NOT DISTINCT FROM
+            (OLD.news_id, OLD.pars_text, OLD.ai_text, OLD.url_image, OLD.is_post, OLD.is_skipped, OLD.post_time,
+             OLD.channel_id)
+        AND NEW.image IS NOT DISTINCT FROM OLD.image
+    THEN
+        -- поменялись только служебные поля (аренда модератора): для потребителей это не изменение
+        NEW.version := OLD.version;
+        NEW.updated_at := OLD.updated_at;
+        RETURN NEW;
+    END IF;
+    NEW.version := txid_current();
+    NEW.updated_at := now();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+# Функция из 0007 без is_skipped
+OLD_SET_VERSION = """
+CREATE OR REPLACE FUNCTION post_news_set_version() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE'
+        AND (NEW.news_id, NEW.pars_text, NEW.ai_text, NEW.url_image, NEW.is_post, NEW.post_time, NEW.channel_id)
+            IS NOT DISTINCT FROM
+            (OLD.news_id, OLD.pars_text, OLD.ai_text, OLD.url_image, OLD.is_post, OLD.post_time, OLD.channel_id)
+        AND NEW.image IS NOT DISTINCT FROM OLD.image
+    THEN
+        NEW.version := OLD.version;
+        NEW.updated_at := OLD.updated_at;
+        RETURN NEW;
+    END IF;
+    NEW.version := txid_current();
+    NEW.updated_at := now();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+def update_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(SET_VERSION)
+
+
+def restore_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(OLD_SET_VERSION)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0008_post_news_schedule'),
+    ]
+
+    operations = [
+        migrations.RunPython(update_trigger, restore_trigger),
+    ]
@@ -0,0 +1,110 @@
+# Generated by Django 5.2.1 on 2026-10-19 11:39
+
+from django.conf import settings
+from django.db import migrations, models
+
+# published_version ведёт только триггер: save() из формы может записать устаревшее значение.
+# Он же шлёт боту NOTIFY post_news_published при публикации, в той же транзакции.
+# xmin в уведомлении - граница, до которой все публикации уже закоммичены и доставлены раньше этой,
+# поэтому слушатель может сохранить курсор (xmin, 0), не делая запросов (см. news/listener.py).
+SET_VERSION = """
+CREATE OR REPLACE FUNCTION post_news_set_version() RETURNS trigger AS $$
+BEGIN
+    IF NOT (NEW.is_post IS TRUE AND NOT NEW.is_skipped) THEN
+        NEW.published_version := NULL;
+    ELSIF TG_OP = 'UPDATE' AND OLD.is_post IS TRUE AND NOT OLD.is_skipped
+        AND NEW.post_time IS NOT DISTINCT FROM OLD.post_time
+    THEN
+        -- пост уже был опубликован с этим временем: правка текста боту не нужна
+        NEW.published_version := OLD.published_version;
+    ELSE
+        NEW.published_version := txid_current();
+        PERFORM pg_notify('post_news_published', json_build_object(
+            'id', NEW.id,
+            'channel', NEW.channel_id,
+            'post_time', NEW.post_time,
+            'version', NEW.published_version,
+            'xmin', txid_snapshot_xmin(txid_current_snapshot())
+        )::text);
+    END IF;
+
+    IF TG_OP = 'UPDATE'
+        AND (NEW.news_id, NEW.pars_text, NEW.ai_text, NEW.url_image, NEW.is_post, NEW.is_skipped, NEW.post_time,
+             NEW.channel_id)
+            IS NOT DISTINCT FROM
+            (OLD.news_id, OLD.pars_text, OLD.ai_text, OLD.url_image, OLD.is_post, OLD.is_skipped, OLD.post_time,
+             OLD.channel_id)
+        AND NEW.image IS NOT DISTINCT FROM OLD.image
+    THEN
+        -- поменялись только служебные поля (аренда модератора): для потребителей это не изменение
+        NEW.version := OLD.version;
+        NEW.updated_at := OLD.updated_at;
+        RETURN NEW;
+    END IF;
+    NEW.version := txid_current();
+    NEW.updated_at := now();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+# Функция из 0009
+OLD_SET_VERSION = """
+CREATE OR REPLACE FUNCTION post_news_set_version() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE'
+        AND (NEW.news_id, NEW.pars_text, NEW.ai_text, NEW.url_image, NEW.is_post, NEW.is_skipped, NEW.post_time,
+             NEW.channel_id)
+            IS NOT DISTINCT FROM
+            (OLD.news_id, OLD.pars_text, OLD.ai_text, OLD.url_image, OLD.is_post, OLD.is_skipped, OLD.post_time,
+             OLD.channel_id)
+        AND NEW.image IS NOT DISTINCT FROM OLD.image
+    THEN
+        NEW.version := OLD.version;
+        NEW.updated_at := OLD.updated_at;
+        RETURN NEW;
+    END IF;
+    NEW.version := txid_current();
+    NEW.updated_at := now();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+# Уже опубликованные посты считаем опубликованными в их текущей версии. Выполняется до замены функции:
+# старая не трогает published_version и не меняет version, раз остальные поля те же
+BACKFILL = """
+UPDATE post_news SET published_version = version WHERE is_post IS TRUE AND NOT is_skipped;
+"""
+
+
+def update_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(BACKFILL)
+        schema_editor.execute(SET_VERSION)
+
+
+def restore_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(OLD_SET_VERSION)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0009_post_news_version_is_skipped'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='postnews',
+            name='published_version',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='postnews',
+            index=models.Index(fields=['published_version', 'id'], name='post_news_published_idx'),
+        ),
+        migrations.RunPython(update_trigger, restore_trigger),
+    ]
@@ -8,6 +8,10 @@ class TelegramChannel(models.Model):
     # Это поле хранит фактический ID телеграм-канала, оно должно быть UNIQUE
     channel_id = models.BigIntegerField(unique=True, null=False, blank=False)  # Сделаем его обязательным, раз это
     # ключ для связи
+    # Настройки расписания публикаций (см. news/scheduling.py)
+    min_post_interval = models.PositiveIntegerField(default=0, verbose_name='Минимальный интервал между постами, мин')
+    quiet_hours_start = models.TimeField(null=True, blank=True, verbose_name='Тихие часы с')
+    quiet_hours_end = models.TimeField(null=True, blank=True, verbose_name='Тихие часы до')
 
     class Meta:
         db_table = 'telegram_channels'
@@ -27,7 +31,26 @@ class PostNews(models.Model):
     url_image = models.TextField(null=True, blank=True)
     image = models.BinaryField(null=True, blank=True)
     is_post = models.BooleanField(null=True, blank=True, default=False)
+    # Пропущенный модератором пост: is_post=True (разобран), но не публикуется и слот не занимает.
+    # Значение по умолчанию задано и в базе, чтобы вставки парсера мимо Django не ломались
+    is_skipped = models.BooleanField(default=False, db_default=False)
     post_time = models.DateTimeField(null=True, blank=True)
+    # Аренда поста модератором в режиме «следующая новость» (см. news/moderation.py)
+    lease_owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    lease_until = models.DateTimeField(null=True, blank=True)
+    # Ведутся триггером PostgreSQL на любой записи, включая массовые UPDATE и запись мимо Django
+    # (см. миграцию 0007): version - txid_current() последней меняющей транзакции
+    updated_at = models.DateTimeField(null=True, blank=True, editable=False)
+    version = models.BigIntegerField(default=0, editable=False)
+    # txid транзакции, опубликовавшей пост (или перенёсшей его post_time); NULL, пока пост не опубликован.
+    # По нему бот догоняет только публикации, а не любые правки опубликованных постов (миграция 0010)
+    published_version = models.BigIntegerField(null=True, blank=True, editable=False)
 
     channel = models.ForeignKey(
         TelegramChannel,
@@ -40,12 +63,53 @@ class PostNews(models.Model):
 
     class Meta:
         db_table = 'post_news'
+        indexes = [
+            models.Index(fields=['version', 'id'], name='post_news_version_idx'),
+            models.Index(fields=['published_version', 'id'], name='post_news_published_idx'),
+            # Окна расписания для раздачи слотов (news/scheduling.py)
+            models.Index(fields=['post_time'], name='post_news_post_time_idx'),
+            models.Index(fields=['channel', 'post_time'], name='post_news_channel_time_idx'),
+        ]
         verbose_name = 'Новость (новая)'
         verbose_name_plural = 'Новости (новые)'
 
     def __str__(self):
         return f"Новость ID: {self.news_id or self.id}"
 
+    # Поля, от которых зависит индекс дубликатов (news/duplicates.py)
+    INDEXED_FIELDS = ('pars_text', 'ai_text', 'channel_id')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Запоминаем загруженный текст: сигнал post_save сравнивает с ним и не пересчитывает
+        # MinHash, если текст и канал не менялись
+        instance._indexed_values = instance.indexed_values()
+        return instance
+
+    def indexed_values(self):
+        # None, если часть полей отложена (defer/only): тогда сравнить не с чем
+        if any(field not in self.__dict__ for field in self.INDEXED_FIELDS):
+            return None
+        return tuple(self.__dict__[field] for field in self.INDEXED_FIELDS)
+
+
+class PostNewsTombstone(models.Model):
+    # След удалённой новости для синхронизации потребителей; пишется триггером при DELETE
+    post_id = models.BigIntegerField()
+    channel_tg_id = models.BigIntegerField(null=True, blank=True)
+    version = models.BigIntegerField()
+    deleted_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'post_news_tombstone'
+        indexes = [
+            models.Index(fields=['version', 'post_id'], name='post_news_tombstone_ver_idx'),
+        ]
+
+    def __str__(self):
+        return f"Удалена новость {self.post_id}"
+
 
 class UserChannelPermission(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
@@ -58,4 +122,78 @@ class UserChannelPermission(models.Model):
         verbose_name_plural = 'Разрешения пользователей на каналы'
 
     def __str__(self):
-        return f"{self.user.username} - {self.channel.name}"
\ No newline at end of file
+        return f"{self.user.username} - {self.channel.name}"
+
+
+class PostNewsSignature(models.Model):
+    # MinHash текста новости для поиска почти-дубликатов (см. news/duplicates.py)
+    post = models.OneToOneField(PostNews, on_delete=models.CASCADE, primary_key=True, related_name='signature')
+    channel_tg_id = models.BigIntegerField(null=True, blank=True)  # копия post.channel_id, чтобы не делать JOIN
+    minhash = models.BinaryField()  # NUM_PERM беззнаковых 32-битных значений подряд
+    duplicate_of = models.ForeignKey(
+        PostNews,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+
+    class Meta:
+        db_table = 'post_news_signature'
+        verbose_name = 'Сигнатура новости'
+        verbose_name_plural = 'Сигнатуры новостей'
+
+    def __str__(self):
+        return f"MinHash новости {self.post_id}"
+
+
+class PostNewsLSHBucket(models.Model):
+    # Одна полоса (band) MinHash -> корзина; кандидаты в дубликаты ищутся только внутри корзин канала
+    post = models.ForeignKey(PostNews, on_delete=models.CASCADE, related_name='lsh_buckets')
+    channel_tg_id = models.BigIntegerField(null=True, blank=True)
+    band_key = models.BigIntegerField()  # хэш (номер полосы, значения полосы)
+
+    class Meta:
+        db_table = 'post_news_lsh_bucket'
+        indexes = [
+            models.Index(fields=['channel_tg_id', 'band_key'], name='post_news_lsh_lookup_idx'),
+        ]
+
+
+class AuditEvent(models.Model):
+    # Журнал действий модераторов. Только дописывается; на PostgreSQL таблица секционирована по месяцам
+    # (см. миграцию 0005), пишется пачками из news/audit.py
+    ACTION_CHOICES = [
+        ('create', 'Создание'),
+        ('edit', 'Редактирование'),
+        ('publish', 'Публикация'),
+        ('skip', 'Пропуск'),
+        ('delete', 'Удаление'),
+        ('perm_add', 'Выдача доступа'),
+        ('perm_change', 'Изменение доступа'),
+        ('perm_remove', 'Отзыв доступа'),
+    ]
+
+    created_at = models.DateTimeField()
+    actor = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,  # журнал не должен мешать удалению пользователей
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    actor_name = models.CharField(max_length=150, blank=True)
+    action = models.CharField(max_length=16, choices=ACTION_CHOICES)
+    post_id = models.BigIntegerField(null=True, blank=True)  # без FK: запись переживает удаление новости
+    channel_tg_id = models.BigIntegerField(null=True, blank=True)
+    details = models.JSONField(default=dict, blank=True)
+
+    class Meta:
+        db_table = 'audit_log'
+        ordering = ['-created_at']
+        verbose_name = 'Событие аудита'
+        verbose_name_plural = 'Журнал аудита'
+
+    def __str__(self):
+        return f"{self.created_at:%Y-%m-%d %H:%M:%S} {self.actor_name or '-'} {self.action}"
@@ -0,0 +1,169 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .audit import record_on_commit
+from .models import PostNews
+from .pg_notify import POST_EVENTS_CHANNEL, notify
+from .scheduling import SlotAllocator, lock_schedule
+
+# Сколько секунд пост закреплён за модератором без продления (клиент продлевает аренду, пока открыт пост)
+LEASE_SECONDS = getattr(settings, 'NEWS_LEASE_SECONDS', 120)
+# Сколько кандидатов пробуем захватить за один проход, прежде чем перечитать очередь
+LEASE_CANDIDATES = 5
+
+UNMODERATED = Q(is_post=False) | Q(is_post__isnull=True)
+
+
+class ModerationConflict(Exception):
+    pass
+
+
+def _lease_free_for(user, now):
+    return Q(lease_until__isnull=True) | Q(lease_until__lte=now) | Q(lease_owner=user)
+
+
+def _post_event(event, post):
+    return {
+        'event': event,
+        'id': post.pk,
+        'news_id': post.news_id,
+        'channel': post.channel_id,
+        'post_time': post.post_time.isoformat() if post.post_time else None,
+    }
+
+
+def _moderate(post, values, user, require_unmoderated):
+    # Условный UPDATE вместо save(): если пост уже разобран или его держит другой модератор,
+    # обновится ноль строк и мы сообщим о конфликте, а не перезапишем чужое решение
+    now = timezone.now()
+    qs = PostNews.objects.filter(pk=post.pk)
+    if user is not None:
+        qs = qs.filter(_lease_free_for(user, now))
+    if require_unmoderated:
+        qs = qs.filter(UNMODERATED)
+    if not qs.update(lease_owner=None, lease_until=None, **values):
+        raise ModerationConflict(f'Новость ID {post.pk} уже разобрана или её сейчас разбирает другой модератор.')
+    for field, value in values.items():
+        setattr(post, field, value)
+    post.lease_owner = post.lease_until = None
+
+
+def publish_post(post, post_time=None, user=None, require_unmoderated=False):
+    # Общая точка для всех способов публикации: форма, ?publish= и JSON-запросы из очередей.
+    # post_time - «не раньше»: пост получает ближайший свободный слот своего канала
+    with transaction.atomic():
+        lock_schedule()
+        slot = SlotAllocator(exclude=[post.pk]).allocate(post.channel_id, post_time or post.post_time)
+        _moderate(post, {'is_post': True, 'is_skipped': False, 'post_time': slot}, user, require_unmoderated)
+        # Уведомление для бота (post_news_published) шлёт триггер версии, см. миграцию 0010
+        notify(POST_EVENTS_CHANNEL, _post_event('published', post))
+        record_on_commit('publish', actor=user, post=post, post_time=post.post_time.isoformat())
+    return post
+
+
+def skip_post(post, user=None, require_unmoderated=False):
+    with transaction.atomic():
+        _moderate(post, {'is_post': True, 'is_skipped': True}, user, require_unmoderated)
+        notify(POST_EVENTS_CHANNEL, _post_event('skipped', post))
+        record_on_commit('skip', actor=user, post=post)
+    return post
+
+
+def plan_slots(posts, earliest=None):
+    # Предпросмотр расписания без сохранения: [(post, slot), ...] в порядке posts
+    allocator = SlotAllocator(exclude=[post.pk for post in posts])
+    return [(post, allocator.allocate(post.channel_id, earliest)) for post in posts]
+
+
+def publish_many(post_ids, user, earliest=None):
+    """
+    Массовое одобрение: раскладывает посты по слотам и сохраняет одним bulk_update.
+    Уже разобранные и занятые другими модераторами посты пропускаются. Возвращает опубликованные посты.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        lock_schedule()
+        posts = list(
+            PostNews.objects
+            .filter(pk__in=post_ids)
+            .filter(UNMODERATED)
+            .filter(_lease_free_for(user, now))
+            .select_for_update()
+            .defer('image')
+            .order_by('id')
+        )
+        for post, slot in plan_slots(posts, earliest):
+            post.is_post = True
+            post.is_skipped = False
+            post.post_time = slot
+            post.lease_owner = post.lease_until = None
+        PostNews.objects.bulk_update(posts, ['is_post', 'is_skipped', 'post_time', 'lease_owner', 'lease_until'],
+                                     batch_size=500)
+        for post in posts:
+            notify(POST_EVENTS_CHANNEL, _post_event('published', post))
+            record_on_commit('publish', actor=user, post=post, post_time=post.post_time.isoformat())
+    return posts
+
+
+def _lease_candidates(queryset, user, now, exclude, limit):
+    return list(
+        queryset
+        .filter(UNMODERATED)
+        .filter(_lease_free_for(user, now))
+        .exclude(pk__in=exclude)
+        .order_by('id')
+        .values_list('id', flat=True)[:limit]
+    )
+
+
+def lease_next(queryset, user, exclude=()):
+    """
+    Закрепляет за user следующий неразобранный пост из queryset и возвращает его id (или None).
+    Захват - атомарный условный UPDATE: из нескольких модераторов, выбравших один кандидат,
+    строку получит только один, остальные перейдут к следующему кандидату.
+    Просроченная аренда считается свободной, так что брошенные посты возвращаются в очередь сами.
+    """
+    while True:
+        now = timezone.now()
+        candidates = _lease_candidates(queryset, user, now, exclude, LEASE_CANDIDATES)
+        if not candidates:
+            return None
+        for post_id in candidates:
+            won = (
+                PostNews.objects
+                .filter(pk=post_id)
+                .filter(UNMODERATED)
+                .filter(_lease_free_for(user, now))
+                .update(lease_owner=user, lease_until=now + timedelta(seconds=LEASE_SECONDS))
+            )
+            if won:
+                # Предыдущие аренды этого модератора больше не нужны
+                release_leases(user, keep=post_id)
+                return post_id
+
+
+def peek_next(queryset, user, exclude=(), limit=3):
+    # Кандидаты без захвата: клиент заранее подгружает их данные и картинки
+    return _lease_candidates(queryset, user, timezone.now(), exclude, limit)
+
+
+def renew_lease(post_id, user):
+    now = timezone.now()
+    return bool(
+        PostNews.objects
+        .filter(pk=post_id, lease_owner=user, lease_until__gt=now)
+        .update(lease_until=now + timedelta(seconds=LEASE_SECONDS))
+    )
+
+
+def release_leases(user, post_id=None, keep=None):
+    qs = PostNews.objects.filter(lease_owner=user)
+    if post_id is not None:
+        qs = qs.filter(pk=post_id)
+    if keep is not None:
+        qs = qs.exclude(pk=keep)
+    return qs.update(lease_owner=None, lease_until=None)
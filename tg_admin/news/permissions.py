@@ -0,0 +1,78 @@
+import time
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache
+
+from .models import UserChannelPermission
+
+# Снимки прав пользователей в общем кэше (CACHES['default']). Любое изменение пользователей, групп,
+# прав или UserChannelPermission сдвигает поколение, и все старые снимки перестают находиться
+# (см. signals.py). Сдвиг поколения виден только через общий кэш: в кэше в памяти процесса другие
+# процессы принимали бы отключённого пользователя или отозванное право, поэтому с таким кэшем
+# пользователи и права между запросами не кэшируются (как и сессии, см. settings.py).
+# AUTH_CACHE_TIMEOUT - страховка на случай потерянного сигнала.
+CACHE_TIMEOUT = getattr(settings, 'AUTH_CACHE_TIMEOUT', 60)
+GENERATION_KEY = 'news:auth:generation'
+PER_PROCESS_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def cache_is_shared(alias=DEFAULT_CACHE_ALIAS):
+    return settings.CACHES.get(alias, {}).get('BACKEND') not in PER_PROCESS_BACKENDS
+
+
+def generation():
+    value = cache.get(GENERATION_KEY)
+    if value is None:
+        # Начинаем с текущего времени: если ключ вытеснили, новое поколение не совпадёт со старыми
+        cache.add(GENERATION_KEY, int(time.time() * 1000), None)
+        value = cache.get(GENERATION_KEY)
+    return value
+
+
+def bump_generation():
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        generation()
+
+
+def snapshot_key(kind, user_id):
+    return f'news:auth:{kind}:{generation()}:{user_id}'
+
+
+def user_key(user_id):
+    # Сам пользователь кэшируется без поколения и сбрасывается точечно при его сохранении
+    return f'news:auth:user:{user_id}'
+
+
+def allowed_channel_ids(user):
+    """
+    TG ID каналов, доступных пользователю, или None для суперпользователя (доступно всё).
+    Запоминается на объекте пользователя на время запроса и, если кэш общий, между запросами.
+    """
+    if user.is_superuser:
+        return None
+    cached = getattr(user, '_allowed_channel_ids', None)
+    if cached is not None:
+        return cached
+    shared = cache_is_shared()
+    key = snapshot_key('channels', user.pk) if shared else None
+    cached = cache.get(key) if shared else None
+    if cached is None:
+        cached = frozenset(
+            UserChannelPermission.objects
+            .filter(user_id=user.pk)
+            .values_list('channel__channel_id', flat=True)
+        )
+        if shared:
+            cache.set(key, cached, CACHE_TIMEOUT)
+    user._allowed_channel_ids = cached
+    return cached
+
+
+def can_access_channel(user, channel_tg_id):
+    allowed = allowed_channel_ids(user)
+    return allowed is None or channel_tg_id in allowed
@@ -0,0 +1,44 @@
+import json
+
+from django.conf import settings
+from django.db import connection
+
+# Каналы PostgreSQL LISTEN/NOTIFY, которые использует админка
+POST_EVENTS_CHANNEL = 'post_news_events'
+# Компактные уведомления для бота об опубликованных постах: {"id", "channel", "post_time", "version", "xmin"}.
+# Шлёт их триггер post_news_set_version (миграция 0010), так что публикации мимо Django тоже доходят
+POST_PUBLISHED_CHANNEL = 'post_news_published'
+
+
+def is_supported():
+    return connection.vendor == 'postgresql'
+
+
+def notify(channel, payload):
+    """
+    Отправляет NOTIFY в текущем соединении Django. Внутри транзакции PostgreSQL доставит
+    уведомление только после COMMIT, а при откате не доставит вовсе.
+    """
+    if not is_supported():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_notify(%s, %s)', [channel, json.dumps(payload, default=str)])
+
+
+def open_listen_connection(channels, alias='default'):
+    # Отдельное соединение вне пула Django: оно живёт долго и только слушает
+    import psycopg2
+
+    db = settings.DATABASES[alias]
+    conn = psycopg2.connect(
+        dbname=db.get('NAME'),
+        user=db.get('USER'),
+        password=db.get('PASSWORD'),
+        host=db.get('HOST') or None,
+        port=db.get('PORT') or None,
+    )
+    conn.autocommit = True
+    with conn.cursor() as cursor:
+        for channel in channels:
+            cursor.execute(f'LISTEN "{channel}"')
+    return conn
@@ -0,0 +1,291 @@
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+
+# Профилирование включается для доли запросов или по запросу суперпользователя
+# (заголовок X-Profile: 1 или cookie tg_profile=1). Отчёты лежат кольцом в PROFILING_DIR.
+# В отчётах текст SQL и параметры запросов, поэтому каталог по умолчанию внутри проекта, а не в общем /tmp,
+# и доступен только владельцу процесса (0700, файлы 0600).
+SAMPLE_RATE = getattr(settings, 'PROFILING_SAMPLE_RATE', 0.0)
+SAMPLE_INTERVAL = getattr(settings, 'PROFILING_INTERVAL', 0.005)
+REPORTS_DIR = str(getattr(settings, 'PROFILING_DIR', os.path.join(settings.BASE_DIR, 'profiles')))
+MAX_REPORTS = getattr(settings, 'PROFILING_MAX_REPORTS', 50)
+EXPLAIN_TOP = getattr(settings, 'PROFILING_EXPLAIN_TOP', 3)
+HEADER = 'HTTP_X_PROFILE'
+COOKIE = 'tg_profile'
+
+_MAX_STACK_DEPTH = 64
+_TOP_FUNCTIONS = 100
+_TOP_STACKS = 50
+_TOP_QUERIES = 20
+_REPORT_ID_RE = re.compile(r'[0-9]{8}-[0-9]{6}-[0-9a-f]{8}')
+
+
+_PROJECT_DIR = str(settings.BASE_DIR) + os.sep
+
+
+def _frame_label(code):
+    # Для кода проекта путь от корня (news/admin.py), для остального - от site-packages
+    filename = code.co_filename
+    if filename.startswith(_PROJECT_DIR):
+        filename = filename[len(_PROJECT_DIR):]
+    elif 'site-packages' + os.sep in filename:
+        filename = filename.split('site-packages' + os.sep, 1)[1]
+    return f'{code.co_name} ({filename}:{code.co_firstlineno})', code.co_filename.startswith(_PROJECT_DIR)
+
+
+class StackSampler:
+    """Статистический профайлер: фоновый поток раз в interval снимает стек профилируемого потока."""
+
+    def __init__(self, thread_id=None, interval=SAMPLE_INTERVAL):
+        # Под ASGI поток, где выполнится view, заранее неизвестен: его сообщает process_view
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.project_functions = set()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if self.thread_id is None:
+                continue
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and len(stack) < _MAX_STACK_DEPTH:
+                label, in_project = _frame_label(frame.f_code)
+                stack.append(label)
+                if in_project:
+                    self.project_functions.add(label)
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(reversed(stack))] += 1
+                self.samples += 1
+
+    def summary(self):
+        own = Counter()
+        total = Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for function in set(stack):
+                total[function] += count
+        functions = [
+            {'function': function, 'total': count, 'own': own[function], 'project': function in self.project_functions}
+            for function, count in total.most_common(_TOP_FUNCTIONS)
+        ]
+        # Горячие точки: где поток реально проводил время, без обёрток middleware сверху стека
+        hot = [{'function': function, 'own': count} for function, count in own.most_common(_TOP_FUNCTIONS // 4)]
+        # Свёрнутые стеки в формате flamegraph.pl: "a;b;c count"
+        stacks = [{'stack': ';'.join(stack), 'count': count} for stack, count in self.stacks.most_common(_TOP_STACKS)]
+        return functions, hot, stacks
+
+
+class QueryRecorder:
+    # Обёртка connection.execute_wrapper: запоминает каждый SQL-запрос и его длительность
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'sql': sql,
+                'params': params,
+                'many': many,
+                'ms': round((time.perf_counter() - started) * 1000, 3),
+            })
+
+
+def _explain(query):
+    if query['many'] or not query['sql'].lstrip().upper().startswith('SELECT'):
+        return None
+    prefix = 'EXPLAIN ' if connection.vendor == 'postgresql' else 'EXPLAIN QUERY PLAN '
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + query['sql'], query['params'])
+            return '\n'.join(' '.join(str(col) for col in row) for row in cursor.fetchall())
+    except Exception as e:
+        return f'EXPLAIN не удался: {e}'
+
+
+def should_profile(request, user):
+    if SAMPLE_RATE and random.random() < SAMPLE_RATE:
+        return True
+    if user is None or not user.is_superuser:
+        return False
+    return request.META.get(HEADER) == '1' or request.COOKIES.get(COOKIE) == '1'
+
+
+def _ensure_reports_dir():
+    os.makedirs(REPORTS_DIR, mode=0o700, exist_ok=True)
+    stat = os.lstat(REPORTS_DIR)
+    # Каталог, заранее созданный другим пользователем (или симлинк на чужой), не используем
+    if not os.path.isdir(REPORTS_DIR) or os.path.islink(REPORTS_DIR) or stat.st_uid != os.getuid():
+        raise PermissionError(f'{REPORTS_DIR} принадлежит другому пользователю')
+    if stat.st_mode & 0o077:
+        os.chmod(REPORTS_DIR, 0o700)
+
+
+def _save_report(report):
+    _ensure_reports_dir()
+    path = os.path.join(REPORTS_DIR, f"{report['id']}.json")
+    tmp_path = path + '.tmp'
+    with open(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, default=str)
+    os.replace(tmp_path, path)
+    # Кольцо: имена начинаются со времени, самые старые отчёты удаляем
+    reports = sorted(name for name in os.listdir(REPORTS_DIR) if name.endswith('.json'))
+    for name in reports[:-MAX_REPORTS]:
+        try:
+            os.remove(os.path.join(REPORTS_DIR, name))
+        except FileNotFoundError:
+            pass
+
+
+def list_reports():
+    if not os.path.isdir(REPORTS_DIR):
+        return []
+    reports = []
+    for name in sorted(os.listdir(REPORTS_DIR), reverse=True):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(REPORTS_DIR, name), encoding='utf-8') as f:
+                report = json.load(f)
+        except (OSError, ValueError):
+            continue
+        reports.append({key: report.get(key) for key in
+                        ('id', 'started_at', 'method', 'path', 'user', 'status', 'duration_ms', 'query_count',
+                         'query_ms', 'samples')})
+    return reports
+
+
+def load_report(report_id):
+    if not _REPORT_ID_RE.fullmatch(report_id):
+        return None
+    try:
+        with open(os.path.join(REPORTS_DIR, f'{report_id}.json'), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class ProfilingMiddleware:
+    # Ставится после AuthenticationMiddleware, чтобы видеть request.user.
+    # Работает и под WSGI, и под ASGI. Под ASGI синхронный view выполняется в отдельном потоке
+    # (sync_to_async) со своим соединением с базой, поэтому и поток для сэмплера, и соединение для записи
+    # запросов берутся в process_view, который Django вызывает в том же потоке, что и view.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not should_profile(request, getattr(request, 'user', None)):
+            return self.get_response(request)
+
+        sampler, recorder = self._start(request, threading.get_ident())
+        try:
+            with connection.execute_wrapper(recorder):
+                response = self.get_response(request)
+        finally:
+            sampler.stop()
+        return self._finish(request, response, sampler, recorder)
+
+    async def __acall__(self, request):
+        if not should_profile(request, await request.auser()):
+            return await self.get_response(request)
+
+        sampler, recorder = self._start(request, None)
+        request._profile_recorder = recorder
+        try:
+            response = await self.get_response(request)
+        finally:
+            sampler.stop()
+        # EXPLAIN и запись отчёта - синхронные операции с базой и файлами, в потоке view
+        return await sync_to_async(self._finish_async)(request, response, sampler, recorder)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        sampler = getattr(request, '_profile_sampler', None)
+        if sampler is not None:
+            sampler.thread_id = threading.get_ident()
+        recorder = getattr(request, '_profile_recorder', None)
+        if recorder is not None and not hasattr(request, '_profile_connection'):
+            db = request._profile_connection = connections[DEFAULT_DB_ALIAS]
+            db.execute_wrappers.append(recorder)
+        return None
+
+    def _finish_async(self, request, response, sampler, recorder):
+        db = getattr(request, '_profile_connection', None)
+        if db is not None and recorder in db.execute_wrappers:
+            db.execute_wrappers.remove(recorder)
+        return self._finish(request, response, sampler, recorder)
+
+    def _start(self, request, thread_id):
+        sampler = StackSampler(thread_id)
+        request._profile_sampler = sampler
+        request._profile_started_at = time.time()
+        request._profile_started = time.perf_counter()
+        sampler.start()
+        return sampler, QueryRecorder()
+
+    def _finish(self, request, response, sampler, recorder):
+        duration_ms = round((time.perf_counter() - request._profile_started) * 1000, 3)
+        try:
+            report = self._build_report(request, response, recorder, sampler, request._profile_started_at,
+                                        duration_ms)
+            _save_report(report)
+            response['X-Profile-Id'] = report['id']
+        except Exception as e:
+            print(f"Ошибка сохранения профиля: {e}")
+        return response
+
+    def _build_report(self, request, response, recorder, sampler, started_at, duration_ms):
+        functions, hot, stacks = sampler.summary()
+        slowest = sorted(recorder.queries, key=lambda q: q['ms'], reverse=True)[:_TOP_QUERIES]
+        for index, query in enumerate(slowest):
+            query['explain'] = _explain(query) if index < EXPLAIN_TOP else None
+            query['params'] = repr(query['params'])[:500]
+        user = getattr(request, 'user', None)
+        return {
+            'id': f'{time.strftime("%Y%m%d-%H%M%S", time.gmtime(started_at))}-{random.getrandbits(32):08x}',
+            'started_at': started_at,
+            'method': request.method,
+            'path': request.get_full_path(),
+            'user': user.get_username() if user is not None and user.is_authenticated else None,
+            'status': response.status_code,
+            'duration_ms': duration_ms,
+            'samples': sampler.samples,
+            'interval_ms': sampler.interval * 1000,
+            'functions': functions,
+            'hot': hot,
+            'stacks': stacks,
+            'query_count': len(recorder.queries),
+            'query_ms': round(sum(q['ms'] for q in recorder.queries), 3),
+            'queries': slowest,
+        }
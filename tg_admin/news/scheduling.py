@@ -0,0 +1,176 @@
+from bisect import bisect_right, insort
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import PostNews, TelegramChannel
+
+
+def min_gap(posts_per_minute):
+    # 0 или None - без общего лимита
+    if not posts_per_minute:
+        return timedelta(0)
+    return timedelta(seconds=60 / posts_per_minute)
+
+
+# Общий лимит бота: не больше стольких постов в минуту по всем каналам.
+# Считаем его минимальным зазором между любыми двумя постами бота.
+BOT_POSTS_PER_MINUTE = getattr(settings, 'TG_BOT_POSTS_PER_MINUTE', 20)
+BOT_MIN_GAP = min_gap(BOT_POSTS_PER_MINUTE)
+# Расписание всех каналов (для общего лимита) читается окнами такой длины, а не целиком
+GLOBAL_WINDOW = timedelta(hours=1)
+
+# Посты, которые бот отправит и которые занимают слоты. Пропущенные тоже is_post=True, но слотов не занимают
+PUBLISHED = Q(is_post=True, is_skipped=False)
+
+# Ключ advisory-блокировки PostgreSQL, под которой раздаются слоты
+SCHEDULE_LOCK_KEY = 0x7467736C6F74  # 'tgslot'
+
+
+def lock_schedule():
+    """Сериализует раздачу слотов до конца текущей транзакции (только PostgreSQL)."""
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', [SCHEDULE_LOCK_KEY])
+
+
+class _Timeline:
+    # Отсортированные времена постов: поиск соседей бинарный, O(log n)
+    def __init__(self, gap):
+        self.gap = gap
+        self.times = []
+
+    def add(self, moment):
+        insort(self.times, moment)
+
+    def conflict_end(self, moment):
+        # Если в (moment - gap, moment + gap) уже есть пост, возвращает ближайшее допустимое время после него
+        if not self.gap:
+            return None
+        index = bisect_right(self.times, moment - self.gap)
+        if index < len(self.times) and self.times[index] < moment + self.gap:
+            return self.times[index] + self.gap
+        return None
+
+
+class SlotAllocator:
+    """
+    Раздаёт опубликованным постам ближайшие свободные слоты post_time с учётом
+    минимального интервала канала, тихих часов канала и общего лимита бота.
+    Расписание читается только по мере надобности: канал и его запланированные посты - при первом
+    слоте для этого канала, посты всех каналов - окнами GLOBAL_WINDOW вокруг проверяемого времени.
+    Дальше всё считается в памяти, так что пачку из сотен постов можно разложить без запросов на каждый,
+    а одиночная публикация не читает расписание всех каналов целиком.
+    """
+
+    def __init__(self, now=None, exclude=(), bot_gap=None):
+        self.now = now or timezone.now()
+        self.exclude = list(exclude)
+        self._global = _Timeline(BOT_MIN_GAP if bot_gap is None else bot_gap)
+        self._global_loaded = None  # (start, end): загруженный промежуток общего расписания
+        self._channels = {}
+        self._timelines = {}
+        self._frontier = {}  # channel_id -> (start, slot): в [start, slot) свободных слотов канала нет
+
+    def _scheduled(self):
+        return PostNews.objects.filter(PUBLISHED).exclude(pk__in=self.exclude)
+
+    @staticmethod
+    def _channel_gap(channel):
+        return timedelta(minutes=channel.min_post_interval or 0)
+
+    def _channel(self, channel_id):
+        if channel_id is None:
+            return None
+        if channel_id not in self._channels:
+            self._channels[channel_id] = TelegramChannel.objects.filter(channel_id=channel_id).first()
+        return self._channels[channel_id]
+
+    def _timeline(self, channel_id):
+        timeline = self._timelines.get(channel_id)
+        if timeline is None:
+            channel = self._channel(channel_id)
+            timeline = self._timelines[channel_id] = _Timeline(self._channel_gap(channel) if channel else None)
+            if timeline.gap:
+                timeline.times = sorted(
+                    self._scheduled()
+                    .filter(channel_id=channel_id, post_time__gt=self.now - timeline.gap)
+                    .values_list('post_time', flat=True)
+                )
+        return timeline
+
+    def _load_global(self, start, end):
+        self._global.times.extend(
+            self._scheduled()
+            .filter(post_time__gte=start, post_time__lt=end)
+            .values_list('post_time', flat=True)
+        )
+        self._global.times.sort()
+
+    def _ensure_global(self, moment):
+        # Для проверки moment нужны посты из [moment - gap, moment + gap). Загруженный промежуток
+        # остаётся непрерывным, поэтому ни один пост не читается дважды
+        gap = self._global.gap
+        if not gap:
+            return
+        start, end = moment - gap, moment + gap
+        if self._global_loaded is None:
+            self._load_global(start, end + GLOBAL_WINDOW)
+            self._global_loaded = (start, end + GLOBAL_WINDOW)
+            return
+        loaded_start, loaded_end = self._global_loaded
+        if start < loaded_start:
+            self._load_global(start, loaded_start)
+            loaded_start = start
+        if end > loaded_end:
+            self._load_global(loaded_end, end + GLOBAL_WINDOW)
+            loaded_end = end + GLOBAL_WINDOW
+        self._global_loaded = (loaded_start, loaded_end)
+
+    def _after_quiet_hours(self, channel_id, moment):
+        channel = self._channel(channel_id)
+        if channel is None or channel.quiet_hours_start is None or channel.quiet_hours_end is None:
+            return None
+        start, end = channel.quiet_hours_start, channel.quiet_hours_end
+        local = timezone.localtime(moment)
+        current = local.time()
+        if start == end:
+            return None
+        if start < end:
+            quiet = start <= current < end
+            end_date = local.date()
+        else:
+            # Тихие часы через полночь, например 23:00-07:00
+            quiet = current >= start or current < end
+            end_date = local.date() + timedelta(days=1) if current >= start else local.date()
+        if not quiet:
+            return None
+        return timezone.make_aware(datetime.combine(end_date, end), local.tzinfo)
+
+    def allocate(self, channel_id, earliest=None):
+        """Возвращает первый свободный слот не раньше earliest и сразу занимает его."""
+        earliest = max(earliest or self.now, self.now)
+        moment = start = earliest
+        # Слоты только занимаются и никогда не освобождаются, поэтому промежуток [start, slot) прошлых вызовов
+        # заведомо занят: пачка одобрений не перебирает заново начало расписания канала
+        frontier = self._frontier.get(channel_id)
+        if frontier is not None and frontier[0] <= earliest <= frontier[1]:
+            start, moment = frontier
+        timeline = self._timeline(channel_id)
+        while True:
+            self._ensure_global(moment)
+            shifted = (
+                self._after_quiet_hours(channel_id, moment)
+                or timeline.conflict_end(moment)
+                or self._global.conflict_end(moment)
+            )
+            if shifted is None:
+                break
+            moment = shifted
+        timeline.add(moment)
+        self._global.add(moment)
+        self._frontier[channel_id] = (start, moment)
+        return moment
@@ -0,0 +1,91 @@
+from django.contrib.auth.models import Group, Permission, User
+from django.core.cache import cache
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .audit import record_on_commit
+from .duplicates import index_post
+from .fragments import row_fragments
+from .models import PostNews, TelegramChannel, UserChannelPermission
+from .permissions import bump_generation, user_key
+
+
+@receiver(post_save, sender=PostNews)
+def update_duplicate_index(sender, instance, created=False, raw=False, **kwargs):
+    # Индекс дубликатов обновляется сразу при сохранении через Django; то, что парсер пишет
+    # мимо Django, индексирует backfill_duplicates --watch по уведомлениям триггера
+    if raw:
+        return
+    update_fields = kwargs.get('update_fields')
+    if update_fields and not {'pars_text', 'ai_text', 'channel'} & set(update_fields):
+        return
+    current = instance.indexed_values()
+    if not created and current is not None and current == getattr(instance, '_indexed_values', None):
+        return  # текст и канал не менялись, MinHash пересчитывать незачем
+    index_post(instance)
+    instance._indexed_values = current
+
+
+@receiver(post_save, sender=PostNews)
+@receiver(post_delete, sender=PostNews)
+def invalidate_row_fragments(sender, instance, **kwargs):
+    row_fragments.invalidate_post(instance.pk)
+
+
+@receiver(post_save, sender=TelegramChannel)
+@receiver(post_delete, sender=TelegramChannel)
+def clear_row_fragments(sender, instance, **kwargs):
+    # Название канала есть в строках всех его постов, проще сбросить кэш целиком
+    row_fragments.clear()
+
+
+@receiver(post_save, sender=UserChannelPermission)
+def audit_channel_permission_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    record_on_commit('perm_add' if created else 'perm_change', channel_tg_id=instance.channel.channel_id,
+                     user_id=instance.user_id, username=instance.user.username)
+
+
+@receiver(post_delete, sender=UserChannelPermission)
+def audit_channel_permission_deleted(sender, instance, **kwargs):
+    record_on_commit('perm_remove', channel_tg_id=instance.channel.channel_id, user_id=instance.user_id)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=Group.permissions.through)
+def audit_auth_permissions_changed(sender, instance, action, reverse, model, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    record_on_commit(
+        'perm_add' if action == 'post_add' else 'perm_remove',
+        target=f'{instance._meta.model_name}:{instance.pk}',
+        related=model._meta.label_lower,
+        ids=sorted(pk_set) if pk_set else None,
+    )
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    cache.delete(user_key(instance.pk))
+    update_fields = kwargs.get('update_fields')
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return  # вход в админку не меняет права
+    bump_generation()
+
+
+@receiver(post_save, sender=UserChannelPermission)
+@receiver(post_delete, sender=UserChannelPermission)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_save, sender=Permission)
+@receiver(post_delete, sender=Permission)
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=Group.permissions.through)
+def invalidate_permission_snapshots(sender, **kwargs):
+    # Снимки прав всех пользователей (news/permissions.py) перестают находиться в кэше
+    if kwargs.get('action', 'post_').startswith('post_'):
+        bump_generation()
@@ -0,0 +1,138 @@
+import hashlib
+import html
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Лимиты Telegram (считаются в UTF-16 code units видимого текста, без разметки)
+CAPTION_LIMIT = 1024  # подпись к фото
+MESSAGE_LIMIT = 4096  # обычное текстовое сообщение
+
+# Меняйте при изменении правил рендера, чтобы не отдавать старые превью из кэша
+RENDER_VERSION = 1
+CACHE_PREFIX = 'tg_preview'
+CACHE_TIMEOUT = getattr(settings, 'TG_PREVIEW_CACHE_TIMEOUT', 60 * 60 * 24)
+
+ALLOWED_LINK_SCHEMES = ('http://', 'https://', 'tg://')
+
+_LINK_RE = re.compile(r'\[([^\]\n]+)\]\(([^)\s]+)\)')
+_URL_RE = re.compile(r'\b(https?://[^\s<]+[^\s<.,;:!?)\]])')
+_CODE_RE = re.compile(r'`([^`\n]+)`')
+_INLINE_RULES = [
+    (re.compile(r'\*\*(.+?)\*\*', re.S), 'b'),
+    (re.compile(r'__(.+?)__', re.S), 'u'),
+    (re.compile(r'~~(.+?)~~', re.S), 's'),
+    (re.compile(r'(?<![\w*])\*(?!\s)([^*\n]+?)\*(?![\w*])'), 'i'),
+    (re.compile(r'(?<![\w_])_(?!\s)([^_\n]+?)_(?![\w_])'), 'i'),
+]
+_TAG_RE = re.compile(r'<[^>]+>')
+_LEFTOVER_MARKUP_RE = re.compile(r'\*\*|__|~~|`')
+
+
+def _utf16_len(text):
+    return len(text.encode('utf-16-le')) // 2
+
+
+def preview_cache_key(text, has_image):
+    digest = hashlib.sha1((text or '').encode('utf-8')).hexdigest()
+    return f'{CACHE_PREFIX}:{RENDER_VERSION}:{int(bool(has_image))}:{digest}'
+
+
+def render_preview(text, has_image=False):
+    """Превращает ai_text в HTML для parse_mode=HTML и проверяет его на лимиты Telegram."""
+    text = (text or '').strip()
+    errors = []
+    warnings = []
+    links = []
+
+    if not text:
+        errors.append('Текст пустой')
+        return {'html': '', 'length': 0, 'limit': CAPTION_LIMIT if has_image else MESSAGE_LIMIT,
+                'links': links, 'errors': errors, 'warnings': warnings}
+
+    # Сначала экранируем всё, потом разворачиваем разрешённую разметку
+    body = html.escape(text, quote=False)
+
+    # Код и ссылки вырезаем в плейсхолдеры, чтобы внутри них не срабатывала остальная разметка
+    chunks = []
+
+    def _stash(chunk):
+        chunks.append(chunk)
+        return f'\x00{len(chunks) - 1}\x00'
+
+    body = _CODE_RE.sub(lambda match: _stash(f'<code>{match.group(1)}</code>'), body)
+
+    def _link(match):
+        label, url = match.group(1), html.unescape(match.group(2))
+        if not url.startswith(ALLOWED_LINK_SCHEMES):
+            errors.append(f'Недопустимая ссылка: {url}')
+            return match.group(0)
+        links.append(url)
+        return _stash(f'<a href="{html.escape(url)}">{label}</a>')
+
+    body = _LINK_RE.sub(_link, body)
+
+    def _bare_url(match):
+        links.append(html.unescape(match.group(1)))
+        return _stash(match.group(1))
+
+    body = _URL_RE.sub(_bare_url, body)
+
+    for pattern, tag in _INLINE_RULES:
+        body = pattern.sub(rf'<{tag}>\1</{tag}>', body)
+
+    if _LEFTOVER_MARKUP_RE.search(_TAG_RE.sub('', body)):
+        warnings.append('Незакрытая разметка (**, __, ~~ или `) останется в тексте как есть')
+    if len(set(links)) != len(links):
+        warnings.append('Одна и та же ссылка встречается несколько раз')
+
+    for index, chunk in enumerate(chunks):
+        body = body.replace(f'\x00{index}\x00', chunk)
+
+    visible = html.unescape(_TAG_RE.sub('', body))
+    length = _utf16_len(visible)
+    limit = CAPTION_LIMIT if has_image else MESSAGE_LIMIT
+    if length > limit:
+        kind = 'подписи к фото' if has_image else 'сообщения'
+        errors.append(f'Превышен лимит {kind}: {length} из {limit} символов')
+
+    return {'html': body, 'length': length, 'limit': limit, 'links': links,
+            'errors': errors, 'warnings': warnings}
+
+
+def get_preview(text, has_image=False):
+    key = preview_cache_key(text, has_image)
+    preview = cache.get(key)
+    if preview is None:
+        preview = render_preview(text, has_image)
+        cache.set(key, preview, CACHE_TIMEOUT)
+    return preview
+
+
+def _has_image(post):
+    # В списке новостей image отложен, а наличие картинки приходит аннотацией has_image
+    has_image = getattr(post, 'has_image', None)
+    return bool(post.image) if has_image is None else has_image
+
+
+def warm_previews(posts):
+    """Прогревает превью для страницы списка одним get_many/set_many и цепляет их к объектам."""
+    posts = list(posts)
+    keys = {post.pk: preview_cache_key(post.ai_text, _has_image(post)) for post in posts}
+    cached = cache.get_many(set(keys.values()))
+    missing = {}
+    for post in posts:
+        key = keys[post.pk]
+        preview = cached.get(key) or missing.get(key)
+        if preview is None:
+            preview = missing[key] = render_preview(post.ai_text, _has_image(post))
+        post._tg_preview = preview
+    if missing:
+        cache.set_many(missing, CACHE_TIMEOUT)
+    return posts
+
+
+def invalidate_preview(text):
+    # Старое превью могло быть посчитано и с фото, и без него
+    cache.delete_many([preview_cache_key(text, True), preview_cache_key(text, False)])
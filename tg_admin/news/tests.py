@@ -1,3 +1,675 @@
-from django.test import TestCase
+import os
+import tempfile
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import Group, Permission, User
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import audit, duplicates, moderation, permissions, profiling, telegram_preview
+from .auth_backends import CachedModelBackend
+from .fragments import row_fragments
+from .listener import PublishedPostListener
+from .models import PostNews, PostNewsSignature, PostNewsTombstone, TelegramChannel, UserChannelPermission
+from .moderation import lease_next, release_leases
+from .scheduling import SlotAllocator, min_gap
+from .views import changes_since
+
+
+class ModerationTestMixin:
+    @classmethod
+    def setUpTestData(cls):
+        cls.channel = TelegramChannel.objects.create(name='hockey', channel_id=100)
+        cls.other_channel = TelegramChannel.objects.create(name='football', channel_id=200)
+        cls.alice = cls._moderator('alice', cls.channel)
+        cls.bob = cls._moderator('bob', cls.channel)
+
+    @classmethod
+    def _moderator(cls, username, channel):
+        user = User.objects.create_user(username, password='pw', is_staff=True)
+        user.user_permissions.set(Permission.objects.filter(codename__endswith='postnews'))
+        UserChannelPermission.objects.create(user=user, channel=channel)
+        return user
+
+    def _post(self, channel=None, **kwargs):
+        kwargs.setdefault('ai_text', 'Текст новости')
+        return PostNews.objects.create(channel=channel or self.channel, **kwargs)
+
+
+class LeaseTests(ModerationTestMixin, TestCase):
+    def test_second_moderator_gets_next_post(self):
+        first, second = self._post(), self._post()
+        self.assertEqual(lease_next(PostNews.objects.all(), self.alice), first.pk)
+        self.assertEqual(lease_next(PostNews.objects.all(), self.bob), second.pk)
+
+    def test_race_for_same_candidate(self):
+        first, second = self._post(), self._post()
+        lease_next(PostNews.objects.all(), self.alice)
+        # Боб прочитал кандидатов до того, как Алиса захватила первый пост
+        stale = mock.patch.object(moderation, '_lease_candidates', side_effect=[[first.pk, second.pk]])
+        with stale:
+            self.assertEqual(lease_next(PostNews.objects.all(), self.bob), second.pk)
+        first.refresh_from_db()
+        self.assertEqual(first.lease_owner, self.alice)
+
+    def test_expired_lease_is_reclaimed(self):
+        post = self._post(lease_owner=self.alice, lease_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(lease_next(PostNews.objects.all(), self.bob), post.pk)
+        post.refresh_from_db()
+        self.assertEqual(post.lease_owner, self.bob)
+
+    def test_active_lease_is_not_reclaimed(self):
+        self._post(lease_owner=self.alice, lease_until=timezone.now() + timedelta(minutes=1))
+        self.assertIsNone(lease_next(PostNews.objects.all(), self.bob))
+
+    def test_release_leases_keeps_one(self):
+        until = timezone.now() + timedelta(minutes=1)
+        kept = self._post(lease_owner=self.alice, lease_until=until)
+        released = self._post(lease_owner=self.alice, lease_until=until)
+        self.assertEqual(release_leases(self.alice, keep=kept.pk), 1)
+        kept.refresh_from_db()
+        released.refresh_from_db()
+        self.assertEqual(kept.lease_owner, self.alice)
+        self.assertIsNone(released.lease_owner)
+
+
+class ModerationViewTests(ModerationTestMixin, TestCase):
+    def test_publish_moderated_post_conflicts(self):
+        post = self._post(is_post=True)
+        self.client.force_login(self.alice)
+        response = self.client.post(reverse('admin:postnews-publish-json', args=[post.pk]))
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(response.json()['ok'])
+
+    def test_post_leased_by_other_moderator_conflicts(self):
+        post = self._post(lease_owner=self.bob, lease_until=timezone.now() + timedelta(minutes=1))
+        self.client.force_login(self.alice)
+        response = self.client.post(reverse('admin:postnews-skip-json', args=[post.pk]))
+        self.assertEqual(response.status_code, 409)
+
+    def test_skip_from_change_view_requires_channel_access(self):
+        post = self._post(channel=self.other_channel)
+        self.client.force_login(self.alice)
+        self.client.get(reverse('admin:news_postnews_change', args=[post.pk]), {'skip': post.pk})
+        post.refresh_from_db()
+        self.assertFalse(post.is_post)
+
+    def test_publish_from_change_form_gets_slot(self):
+        busy = timezone.now() + timedelta(hours=1)
+        PostNews.objects.create(channel=self.channel, is_post=True, post_time=busy)
+        self.channel.min_post_interval = 30
+        self.channel.save()
+        post = self._post()
+        self.client.force_login(self.alice)
+        response = self.client.post(reverse('admin:news_postnews_change', args=[post.pk]), {
+            'channel': self.channel.channel_id, 'ai_text': post.ai_text, 'is_post': 'true',
+            'post_time': busy.strftime('%Y-%m-%dT%H:%M'),
+        })
+        self.assertEqual(response.status_code, 302)
+        post.refresh_from_db()
+        self.assertTrue(post.is_post)
+        self.assertGreaterEqual(post.post_time, busy + timedelta(minutes=30))
+
+    def test_publish_view_requires_channel_access(self):
+        post = self._post(channel=self.other_channel)
+        self.client.force_login(self.alice)
+        response = self.client.post(reverse('admin:postnews-publish', args=[post.pk]), {'post_time': ''})
+        self.assertEqual(response.status_code, 404)
+        post.refresh_from_db()
+        self.assertFalse(post.is_post)
+
+    def test_publish_view_does_not_republish(self):
+        published_at = timezone.now() + timedelta(hours=1)
+        post = self._post(is_post=True, post_time=published_at)
+        self.client.force_login(self.alice)
+        with mock.patch.object(moderation, 'notify') as notify:
+            response = self.client.post(reverse('admin:postnews-publish', args=[post.pk]), {'post_time': ''})
+        self.assertEqual(response.status_code, 302)
+        notify.assert_not_called()
+        post.refresh_from_db()
+        self.assertEqual(post.post_time, published_at)
+
+    def test_skip_from_change_view(self):
+        post = self._post()
+        self.client.force_login(self.alice)
+        self.client.get(reverse('admin:news_postnews_change', args=[post.pk]), {'skip': post.pk})
+        post.refresh_from_db()
+        self.assertTrue(post.is_post)
+
+    def _changelist_queries(self):
+        row_fragments.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(reverse('admin:news_postnews_changelist')).status_code, 200)
+        return len(queries)
+
+    def test_changelist_does_not_load_missing_images(self):
+        self.client.force_login(self.alice)
+        self._post(image=b'jpeg')
+        self._post()
+        self._changelist_queries()  # прогрев кэша пользователя и прав
+        baseline = self._changelist_queries()
+        for _ in range(5):
+            self._post()
+        self.assertEqual(self._changelist_queries(), baseline)
+
+
+NEWS_TEXT = ('Хоккейный клуб СКА обыграл ЦСКА в седьмом матче финала конференции со счётом три один '
+             'и вышел в финал Кубка Гагарина где сыграет с победителем пары Металлург Авангард')
+NEAR_DUPLICATE = NEWS_TEXT.replace('три один', 'три два')
+OTHER_TEXT = 'Футбольный Зенит подписал контракт с бразильским нападающим на четыре года до лета'
+
+
+class DuplicateTests(ModerationTestMixin, TestCase):
+    def _unindexed(self, text, channel=None):
+        # bulk_create не шлёт post_save, поэтому пост остаётся вне индекса, как вставка парсера
+        return PostNews.objects.bulk_create([PostNews(channel=channel or self.channel, pars_text=text)])[0].pk
+
+    def _group(self, post_id):
+        return PostNewsSignature.objects.values_list('duplicate_of_id', flat=True).get(post_id=post_id)
+
+    def test_minhash(self):
+        self.assertIsNone(duplicates.minhash(''))
+        self.assertIsNone(duplicates.minhash(None))
+        self.assertEqual(duplicates.minhash(NEWS_TEXT), duplicates.minhash(NEWS_TEXT.upper()))
+        signature = duplicates.minhash(NEWS_TEXT)
+        self.assertGreaterEqual(duplicates.similarity(signature, duplicates.minhash(NEAR_DUPLICATE)),
+                                duplicates.MIN_SIMILARITY)
+        self.assertLess(duplicates.similarity(signature, duplicates.minhash(OTHER_TEXT)), 0.2)
+        self.assertEqual(len(duplicates.band_keys(signature)), duplicates.BANDS)
+
+    def test_index_rows_groups_near_duplicates_per_channel(self):
+        root = self._unindexed(NEWS_TEXT)
+        duplicate = self._unindexed(NEAR_DUPLICATE)
+        other = self._unindexed(OTHER_TEXT)
+        elsewhere = self._unindexed(NEWS_TEXT, channel=self.other_channel)
+        rows = PostNews.objects.order_by('id').values_list('id', 'pars_text', 'ai_text', 'channel_id')
+        self.assertEqual(duplicates.index_rows(list(rows)), 1)
+        self.assertEqual(self._group(duplicate), root)
+        self.assertIsNone(self._group(root))
+        self.assertIsNone(self._group(other))
+        self.assertIsNone(self._group(elsewhere))
+
+        # Следующая пачка находит кандидатов в базе, и группа держится на самом раннем посте
+        later = self._unindexed(NEAR_DUPLICATE)
+        self.assertEqual(duplicates.index_new_posts([later, root]), 1)
+        self.assertEqual(self._group(later), root)
+
+    def test_index_post_skips_unchanged_text(self):
+        post = self._post(pars_text=NEWS_TEXT)
+        with mock.patch.object(duplicates, 'index_rows') as index_rows:
+            duplicates.index_post(post)
+        index_rows.assert_not_called()
+
+    def test_save_without_text_change_does_not_recompute(self):
+        post = self._post(pars_text=NEWS_TEXT)
+        post = PostNews.objects.get(pk=post.pk)
+        with mock.patch.object(duplicates, 'minhash', wraps=duplicates.minhash) as minhash:
+            post.is_post = True
+            post.save()
+            minhash.assert_not_called()
+            post.pars_text = NEAR_DUPLICATE
+            post.save()
+            minhash.assert_called()
+
+    def test_duplicate_list_filter(self):
+        root = self._post(pars_text=NEWS_TEXT)
+        duplicate = self._post(pars_text=NEAR_DUPLICATE)
+        other = self._post(pars_text=OTHER_TEXT)
+        self.client.force_login(self.alice)
+        expected = {'yes': {duplicate.pk}, 'no': {root.pk, other.pk}, str(root.pk): {root.pk, duplicate.pk}}
+        for value, ids in expected.items():
+            response = self.client.get(reverse('admin:news_postnews_changelist'), {'duplicates': value})
+            self.assertEqual({post.pk for post in response.context['cl'].result_list}, ids, value)
+
+
+class TelegramPreviewTests(ModerationTestMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_escapes_html_and_renders_markup(self):
+        preview = telegram_preview.render_preview('<script>x</script> & **жирный** `a*b*c`')
+        self.assertEqual(preview['html'], '&lt;script&gt;x&lt;/script&gt; &amp; <b>жирный</b> <code>a*b*c</code>')
+        self.assertEqual(preview['errors'], [])
+
+    def test_links(self):
+        preview = telegram_preview.render_preview('[сайт](https://example.com/?a=1&b=2) и https://t.me/news')
+        self.assertEqual(preview['html'],
+                         '<a href="https://example.com/?a=1&amp;b=2">сайт</a> и https://t.me/news')
+        self.assertEqual(preview['links'], ['https://example.com/?a=1&b=2', 'https://t.me/news'])
+        self.assertEqual(preview['length'], len('сайт и https://t.me/news'))
+
+        preview = telegram_preview.render_preview('[клик](javascript:alert(1))')
+        self.assertNotIn('<a', preview['html'])
+        self.assertEqual(len(preview['errors']), 1)
+
+    def test_utf16_length_and_limits(self):
+        # Эмодзи вне BMP - две единицы UTF-16
+        caption = 'а' * (telegram_preview.CAPTION_LIMIT - 1) + '😀'
+        self.assertEqual(telegram_preview.render_preview(caption)['length'], telegram_preview.CAPTION_LIMIT + 1)
+        self.assertEqual(telegram_preview.render_preview(caption)['errors'], [])
+        over = telegram_preview.render_preview(caption, has_image=True)
+        self.assertEqual(over['limit'], telegram_preview.CAPTION_LIMIT)
+        self.assertEqual(len(over['errors']), 1)
+
+        message = 'а' * telegram_preview.MESSAGE_LIMIT
+        self.assertEqual(telegram_preview.render_preview(message)['errors'], [])
+        self.assertEqual(len(telegram_preview.render_preview(message + '!')['errors']), 1)
+        self.assertEqual(len(telegram_preview.render_preview('   ')['errors']), 1)
+
+    def test_over_limit_status_in_changelist(self):
+        self._post(ai_text='а' * (telegram_preview.MESSAGE_LIMIT + 1))
+        self.client.force_login(self.alice)
+        response = self.client.get(reverse('admin:news_postnews_changelist'))
+        self.assertContains(response, f'{telegram_preview.MESSAGE_LIMIT + 1} из {telegram_preview.MESSAGE_LIMIT}')
+
+    def test_get_preview_is_cached(self):
+        render = mock.patch.object(telegram_preview, 'render_preview', wraps=telegram_preview.render_preview)
+        with render as rendered:
+            first = telegram_preview.get_preview('Текст', has_image=True)
+            self.assertEqual(telegram_preview.get_preview('Текст', has_image=True), first)
+            telegram_preview.get_preview('Текст', has_image=False)
+        self.assertEqual(rendered.call_count, 2)
+
+    def test_warm_previews_batches_cache(self):
+        telegram_preview.get_preview('Старый', has_image=False)
+        posts = [PostNews(pk=pk, ai_text=text) for pk, text in enumerate(['Старый', 'Новый', 'Новый'], 1)]
+        for post in posts:
+            post.has_image = False
+        render = mock.patch.object(telegram_preview, 'render_preview', wraps=telegram_preview.render_preview)
+        with render as rendered, mock.patch.object(telegram_preview, 'cache', wraps=cache) as wrapped:
+            telegram_preview.warm_previews(posts)
+        # Промах для одинакового текста считается один раз, кэш читается и пишется по одному разу
+        rendered.assert_called_once_with('Новый', False)
+        self.assertEqual(wrapped.get_many.call_count, 1)
+        self.assertEqual(wrapped.set_many.call_count, 1)
+        self.assertEqual([post._tg_preview['html'] for post in posts], ['Старый', 'Новый', 'Новый'])
+
+    def test_save_invalidates_old_preview(self):
+        post = self._post()
+        telegram_preview.get_preview(post.ai_text, has_image=False)
+        self.client.force_login(self.alice)
+        self.client.post(reverse('admin:news_postnews_change', args=[post.pk]), {
+            'channel': self.channel.channel_id, 'ai_text': 'Исправленный текст', 'is_post': 'unknown',
+        })
+        self.assertEqual(PostNews.objects.get(pk=post.pk).ai_text, 'Исправленный текст')
+        self.assertIsNone(cache.get(telegram_preview.preview_cache_key(post.ai_text, False)))
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.reports_dir = os.path.join(tmp.name, 'profiles')
+        patcher = mock.patch.object(profiling, 'REPORTS_DIR', self.reports_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _report(self, second):
+        report = {'id': f'20260101-0000{second:02d}-0000000{second}', 'path': '/admin/'}
+        profiling._save_report(report)
+        return report['id']
+
+    def test_should_profile(self):
+        factory = RequestFactory()
+        superuser = User(username='root', is_superuser=True)
+        staff = User(username='staff', is_staff=True)
+        by_header = factory.get('/', HTTP_X_PROFILE='1')
+        by_cookie = factory.get('/')
+        by_cookie.COOKIES[profiling.COOKIE] = '1'
+        self.assertTrue(profiling.should_profile(by_header, superuser))
+        self.assertTrue(profiling.should_profile(by_cookie, superuser))
+        self.assertFalse(profiling.should_profile(factory.get('/'), superuser))
+        self.assertFalse(profiling.should_profile(by_header, staff))
+        self.assertFalse(profiling.should_profile(by_header, None))
+        with mock.patch.object(profiling, 'SAMPLE_RATE', 1.0):
+            self.assertTrue(profiling.should_profile(factory.get('/'), None))
+
+    def test_report_ring_is_trimmed_and_private(self):
+        with mock.patch.object(profiling, 'MAX_REPORTS', 2):
+            ids = [self._report(second) for second in range(1, 4)]
+        self.assertEqual([report['id'] for report in profiling.list_reports()], ids[:0:-1])
+        self.assertEqual(os.stat(self.reports_dir).st_mode & 0o777, 0o700)
+        for name in os.listdir(self.reports_dir):
+            self.assertEqual(os.stat(os.path.join(self.reports_dir, name)).st_mode & 0o777, 0o600)
+
+    def test_load_report_validates_id(self):
+        report_id = self._report(1)
+        self.assertEqual(profiling.load_report(report_id)['path'], '/admin/')
+        with open(os.path.join(os.path.dirname(self.reports_dir), 'secret.json'), 'w') as f:
+            f.write('{}')
+        for bad in ('../secret', 'secret', '20260101-000001-0000000Z', report_id + '/..', ''):
+            self.assertIsNone(profiling.load_report(bad), bad)
+        self.assertIsNone(profiling.load_report('20260101-000009-00000009'))
+
+
+SHARED_CACHE_DIR = tempfile.mkdtemp(prefix='tg_admin_cache_')
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                                       'LOCATION': SHARED_CACHE_DIR}})
+class AuthCacheTests(ModerationTestMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.backend = CachedModelBackend()
+        self.permission = Permission.objects.get(codename='view_telegramchannel')
+
+    def _permissions(self):
+        # Новый объект пользователя на каждый «запрос», как после get_user
+        return self.backend.get_all_permissions(self.backend.get_user(self.alice.pk))
+
+    def test_cached_between_requests(self):
+        self._permissions()
+        permissions.allowed_channel_ids(self.backend.get_user(self.alice.pk))
+        with self.assertNumQueries(0):
+            self._permissions()
+            self.assertEqual(permissions.allowed_channel_ids(self.backend.get_user(self.alice.pk)),
+                             {self.channel.channel_id})
+
+    def test_user_save_invalidates(self):
+        self._permissions()
+        self.alice.is_active = False
+        self.alice.save()
+        self.assertIsNone(self.backend.get_user(self.alice.pk))
+
+    def test_user_permissions_change_invalidates(self):
+        self._permissions()
+        self.alice.user_permissions.add(self.permission)
+        self.assertIn('news.view_telegramchannel', self._permissions())
+        self.alice.user_permissions.remove(self.permission)
+        self.assertNotIn('news.view_telegramchannel', self._permissions())
+
+    def test_group_change_invalidates(self):
+        group = Group.objects.create(name='editors')
+        self.alice.groups.add(group)
+        self.assertNotIn('news.view_telegramchannel', self._permissions())
+        group.permissions.add(self.permission)
+        self.assertIn('news.view_telegramchannel', self._permissions())
+        group.delete()
+        self.assertNotIn('news.view_telegramchannel', self._permissions())
+
+    def test_permission_save_invalidates(self):
+        self.alice.user_permissions.add(self.permission)
+        self.assertIn('news.view_telegramchannel', self._permissions())
+        self.permission.codename = 'browse_telegramchannel'
+        self.permission.save()
+        self.assertIn('news.browse_telegramchannel', self._permissions())
+
+    def test_channel_permission_change_invalidates(self):
+        user = self.backend.get_user(self.alice.pk)
+        self.assertEqual(permissions.allowed_channel_ids(user), {self.channel.channel_id})
+        UserChannelPermission.objects.create(user=self.alice, channel=self.other_channel)
+        self.assertEqual(permissions.allowed_channel_ids(self.backend.get_user(self.alice.pk)),
+                         {self.channel.channel_id, self.other_channel.channel_id})
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_per_process_cache_is_not_used(self):
+        self._permissions()
+        # Пользователь, его права и права его групп - заново на каждом запросе
+        with self.assertNumQueries(3):
+            self._permissions()
+
+
+class AuditBufferTests(TestCase):
+    def setUp(self):
+        self.audit = audit
+        self.addCleanup(self._reset_buffer)
+
+    def _reset_buffer(self):
+        with self.audit._lock:
+            self.audit._buffer.clear()
+            if self.audit._timer is not None:
+                self.audit._timer.cancel()
+                self.audit._timer = None
+
+    def test_rolled_back_event_is_not_buffered(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self.audit.record_on_commit('edit', post_id=1)
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(self.audit._buffer, [])
+
+    def test_full_buffer_is_flushed_outside_caller(self):
+        with mock.patch.object(self.audit, 'FLUSH_SIZE', 2), \
+                mock.patch.object(self.audit, 'flush') as flush, \
+                mock.patch.object(self.audit.threading, 'Timer') as timer:
+            timer.return_value.interval = 5
+            self.audit.record('edit', post_id=1)
+            self.audit.record('edit', post_id=2)
+        flush.assert_not_called()
+        self.assertEqual([c.args[0] for c in timer.call_args_list], [self.audit.FLUSH_INTERVAL, 0])
+        self.assertEqual(len(self.audit._buffer), 2)
+
+
+class SlotAllocatorTests(TestCase):
+    now = datetime(2026, 1, 1, 12, 0, tzinfo=dt_timezone.utc)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.hockey = TelegramChannel.objects.create(name='hockey', channel_id=100, min_post_interval=10)
+        cls.football = TelegramChannel.objects.create(name='football', channel_id=200)
+
+    def _scheduled(self, channel, post_time, **kwargs):
+        return PostNews.objects.create(channel=channel, is_post=True, post_time=post_time, **kwargs)
+
+    def _allocator(self, bot_gap=timedelta(seconds=3)):
+        return SlotAllocator(now=self.now, bot_gap=bot_gap)
+
+    def test_quiet_hours_across_midnight(self):
+        self.hockey.quiet_hours_start, self.hockey.quiet_hours_end = time(23, 0), time(7, 0)
+        self.hockey.save()
+        morning = datetime(2026, 1, 2, 7, 0, tzinfo=dt_timezone.utc)
+        allocator = self._allocator()
+        self.assertEqual(allocator.allocate(100, datetime(2026, 1, 1, 23, 30, tzinfo=dt_timezone.utc)), morning)
+        self.assertEqual(allocator.allocate(100, datetime(2026, 1, 2, 1, 0, tzinfo=dt_timezone.utc)),
+                         morning + timedelta(minutes=10))
+        self.assertEqual(allocator.allocate(100, datetime(2026, 1, 1, 22, 0, tzinfo=dt_timezone.utc)),
+                         datetime(2026, 1, 1, 22, 0, tzinfo=dt_timezone.utc))
+
+    def test_channel_gap_and_bot_gap(self):
+        self._scheduled(self.hockey, self.now)
+        allocator = self._allocator()
+        # В своём канале - через min_post_interval, в другом - через общий зазор бота
+        self.assertEqual(allocator.allocate(100), self.now + timedelta(minutes=10))
+        self.assertEqual(allocator.allocate(200), self.now + timedelta(seconds=3))
+
+    def test_bot_gap_beyond_first_window(self):
+        later = self.now + timedelta(hours=5)
+        self._scheduled(self.football, later)
+        self.assertEqual(self._allocator().allocate(100, later), later + timedelta(seconds=3))
+
+    def test_skipped_posts_do_not_take_slots(self):
+        self._scheduled(self.hockey, self.now, is_skipped=True)
+        self.assertEqual(self._allocator().allocate(100), self.now)
+
+    def test_batch_frontier(self):
+        allocator = self._allocator()
+        self.assertEqual(allocator.allocate(100), self.now)
+        with self.assertNumQueries(0):
+            slots = [allocator.allocate(100) for _ in range(3)]
+            # Пост «не раньше» уже занятого промежутка становится после последнего слота
+            slots.append(allocator.allocate(100, self.now + timedelta(minutes=5)))
+        self.assertEqual(slots, [self.now + timedelta(minutes=10 * i) for i in range(1, 5)])
+
+    def test_no_bot_limit(self):
+        self.assertEqual(min_gap(0), timedelta(0))
+        allocator = self._allocator(bot_gap=min_gap(0))
+        self.assertEqual(allocator.allocate(100), self.now)
+        self.assertEqual(allocator.allocate(200), self.now)
+        self.assertEqual(allocator.allocate(200), self.now)
+
+    def test_single_publish_reads_only_its_channel(self):
+        for minute in range(50):
+            self._scheduled(self.football, self.now + timedelta(days=1, minutes=minute))
+        # Канал, его посты и одно окно общего расписания
+        with self.assertNumQueries(3):
+            self.assertEqual(self._allocator().allocate(100), self.now)
+
+
+class PublishedListenerTests(ModerationTestMixin, TestCase):
+    # На SQLite триггера нет: published_version проставляем так, как его поставил бы триггер
+    def _published(self, version, **kwargs):
+        kwargs.setdefault('post_time', timezone.now())
+        post = self._post(is_post=True, **kwargs)
+        PostNews.objects.filter(pk=post.pk).update(published_version=version, version=version)
+        return post.pk
+
+    def _listener(self, cursor):
+        delivered, saved = [], []
+        listener = PublishedPostListener(delivered.append, cursor=cursor, on_cursor=saved.append, page_size=2)
+        return listener, delivered, saved
+
+    def test_catch_up_delivers_publishes_only(self):
+        first, second, third = self._published(5), self._published(6, post_time=None), self._published(6)
+        self._post(is_post=True, is_skipped=True)
+        listener, delivered, saved = self._listener('0:0')
+        listener.catch_up()
+        self.assertEqual([(p['id'], p['version']) for p in delivered], [(first, 5), (second, 6), (third, 6)])
+        self.assertEqual(saved[-1], f'6:{third}')
+
+        # Правка опубликованного поста меняет version, но не published_version: после перезапуска её нет
+        PostNews.objects.filter(pk=first).update(ai_text='Исправлено', version=7)
+        restarted, delivered, _ = self._listener(saved[-1])
+        restarted.catch_up()
+        self.assertEqual(delivered, [])
+
+    def test_notification_moves_cursor_without_queries(self):
+        listener, delivered, saved = self._listener('5:0')
+        payload = {'id': 1, 'channel': 100, 'post_time': None, 'version': 9, 'xmin': 8}
+        with self.assertNumQueries(0):
+            listener.receive(dict(payload))
+            listener.receive(dict(payload))
+        self.assertEqual(delivered, [{'id': 1, 'channel': 100, 'post_time': None, 'version': 9}])
+        self.assertEqual(saved, ['8:0'])
+
+    def test_first_start_skips_history(self):
+        self._published(5)
+        listener, delivered, _ = self._listener(None)
+        listener.catch_up()
+        self.assertEqual(delivered, [])
+        post = self._published(6)
+        listener.catch_up()
+        self.assertEqual([p['id'] for p in delivered], [post])
+
+    def test_idle_does_not_query_posts(self):
+        listener, _, _ = self._listener('0:0')
+        conn = mock.MagicMock()
+        idle = mock.patch('news.listener.select.select', side_effect=[([], [], []), ([], [], []), KeyboardInterrupt])
+        with mock.patch('news.listener.open_listen_connection', return_value=conn), idle, \
+                mock.patch.object(listener, 'catch_up') as catch_up:
+            with self.assertRaises(KeyboardInterrupt):
+                listener.listen()
+        catch_up.assert_called_once_with()
+        self.assertEqual(conn.cursor.return_value.__enter__.return_value.execute.call_count, 2)
+        conn.close.assert_called_once_with()
+
+
+class ChangesCursorTests(ModerationTestMixin, TestCase):
+    # На SQLite триггеров нет, поэтому версии проставляем вручную
+    def _versioned(self, version, channel=None):
+        post = self._post(channel=channel)
+        PostNews.objects.filter(pk=post.pk).update(version=version)
+        return post.pk
+
+    def _tombstone(self, post_id, version, channel=None):
+        PostNewsTombstone.objects.create(post_id=post_id, channel_tg_id=(channel or self.channel).channel_id,
+                                         version=version, deleted_at=timezone.now())
+
+    def _pages(self, cursor=None, limit=1, **kwargs):
+        pages = []
+        while True:
+            page = changes_since(cursor, limit, **kwargs)
+            pages.append(page)
+            cursor = page['cursor']
+            if not page['has_more']:
+                return pages
+
+    def test_rows_and_tombstones_with_same_version(self):
+        first, removed, third = (self._versioned(7) for _ in range(3))
+        PostNews.objects.filter(pk=removed).delete()
+        self._tombstone(removed, 7)
+        pages = self._pages()
+        self.assertEqual([p['cursor'] for p in pages], [f'7:{first}', f'7:{removed}', f'7:{third}'])
+        self.assertEqual([p['changes'][0]['id'] for p in pages if p['changes']], [first, third])
+        self.assertEqual(pages[1]['deleted'][0]['post_id'], removed)
+
+    def test_page_boundary(self):
+        ids = [self._versioned(version) for version in (3, 4, 5)]
+        page = changes_since(None, 2)
+        self.assertTrue(page['has_more'])
+        self.assertEqual(page['cursor'], f'4:{ids[1]}')
+        page = changes_since(page['cursor'], 2)
+        self.assertFalse(page['has_more'])
+        self.assertEqual([row['id'] for row in page['changes']], [ids[2]])
+        # Ровно limit строк - следующей страницы нет, курсор остаётся на последней строке
+        page = changes_since(f'4:{ids[1]}', 1)
+        self.assertFalse(page['has_more'])
+        self.assertEqual(page['cursor'], f'5:{ids[2]}')
+        self.assertEqual(changes_since(page['cursor'])['changes'], [])
+
+    def test_channel_scoped_tombstones(self):
+        self._tombstone(1000, 1)
+        self._tombstone(1001, 2, channel=self.other_channel)
+        self._versioned(3, channel=self.other_channel)
+        page = changes_since(None, channel_ids=[self.channel.channel_id])
+        self.assertEqual([row['post_id'] for row in page['deleted']], [1000])
+        self.assertEqual(page['changes'], [])
+
+    def test_bad_cursor(self):
+        self.client.force_login(self.alice)
+        for cursor in ('abc', '5', '5:x', '1:2:3'):
+            response = self.client.get(reverse('news:changes'), {'cursor': cursor})
+            self.assertEqual(response.status_code, 400, cursor)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'триггер версии есть только на PostgreSQL')
+class VersionTriggerTests(TransactionTestCase):
+    # Версию ведёт триггер (миграции 0007, 0009); у каждого запроса вне atomic свой txid
+    def setUp(self):
+        self.channel = TelegramChannel.objects.create(name='hockey', channel_id=100)
+        self.post = PostNews.objects.create(channel=self.channel, ai_text='Текст новости', is_post=True,
+                                            post_time=timezone.now())
+
+    def _version(self):
+        return PostNews.objects.values_list('version', flat=True).get(pk=self.post.pk)
+
+    def test_skip_and_unskip_bump_version(self):
+        before = self._version()
+        PostNews.objects.filter(pk=self.post.pk).update(is_skipped=True)
+        skipped = self._version()
+        self.assertGreater(skipped, before)
+        PostNews.objects.filter(pk=self.post.pk).update(is_skipped=False)
+        self.assertGreater(self._version(), skipped)
+
+    def _published_version(self):
+        return PostNews.objects.values_list('published_version', flat=True).get(pk=self.post.pk)
+
+    def test_published_version_tracks_publishes_only(self):
+        published = self._published_version()
+        self.assertIsNotNone(published)
+        PostNews.objects.filter(pk=self.post.pk).update(ai_text='Исправлено')
+        self.assertEqual(self._published_version(), published)
+        PostNews.objects.filter(pk=self.post.pk).update(post_time=timezone.now() + timedelta(hours=1))
+        rescheduled = self._published_version()
+        self.assertGreater(rescheduled, published)
+        PostNews.objects.filter(pk=self.post.pk).update(is_skipped=True)
+        self.assertIsNone(self._published_version())
+        # save() с устаревшим значением из формы не перетирает то, что ведёт триггер
+        self.post.published_version = 1
+        self.post.is_skipped = False
+        self.post.save()
+        self.assertGreater(self._published_version(), rescheduled)
+
+    def test_lease_does_not_bump_version(self):
+        before = self._version()
+        PostNews.objects.filter(pk=self.post.pk).update(lease_until=timezone.now())
+        self.assertEqual(self._version(), before)
@@ -0,0 +1,13 @@
+from django.contrib import admin
+from django.urls import path
+
+from . import views
+
+app_name = 'news'
+
+urlpatterns = [
+    path('changes/', views.changes, name='changes'),
+    path('live/events/', views.live_events, name='live-events'),
+    path('profiles/', admin.site.admin_view(views.profile_list), name='profiles'),
+    path('profiles/<str:report_id>/', admin.site.admin_view(views.profile_detail), name='profile-detail'),
+]
@@ -1,3 +1,173 @@
+import hmac
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connection
+from django.db.models import BooleanField, ExpressionWrapper, Q
+from django.db.models.expressions import RawSQL
+from django.http import (Http404, HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, JsonResponse,
+                         StreamingHttpResponse)
 from django.shortcuts import render
 
-# Create your views here.
+from .live import iter_events
+from .models import PostNews, PostNewsTombstone
+from .permissions import allowed_channel_ids
+from .pg_notify import is_supported
+from .profiling import COOKIE, MAX_REPORTS, list_reports, load_report
+
+
+def live_events_available(request):
+    # Под WSGI Django собирает асинхронный поток целиком в список перед отправкой, а бесконечный
+    # поток событий так и не уйдёт клиенту. Поэтому SSE - только под ASGI (uvicorn admin.asgi:application).
+    return isinstance(request, ASGIRequest) and is_supported()
+
+
+async def live_events(request):
+    # SSE-поток событий очереди модерации
+    user = await request.auser()
+    if not (user.is_active and user.is_staff):
+        return HttpResponseForbidden()
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse('Поток событий доступен только под ASGI-сервером (см. admin/asgi.py)', status=501)
+    if not is_supported():
+        return HttpResponse('LISTEN/NOTIFY доступен только на PostgreSQL', status=501)
+
+    allowed_channels = await sync_to_async(allowed_channel_ids)(user)
+    response = StreamingHttpResponse(iter_events(allowed_channels), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # чтобы nginx не копил события в буфере
+    return response
+
+
+def _profile_context(request, title):
+    if not request.user.is_superuser:
+        raise PermissionDenied
+    return {**admin.site.each_context(request), 'title': title}
+
+
+def profile_list(request):
+    context = _profile_context(request, 'Профили запросов')
+    context.update({'reports': list_reports(), 'max_reports': MAX_REPORTS, 'cookie_name': COOKIE})
+    return render(request, 'admin/profiles.html', context)
+
+
+def profile_detail(request, report_id):
+    context = _profile_context(request, f'Профиль {report_id}')
+    report = load_report(report_id)
+    if report is None:
+        raise Http404
+    context['report'] = report
+    return render(request, 'admin/profile_detail.html', context)
+
+
+CHANGES_PAGE_SIZE = 500
+CHANGES_MAX_PAGE_SIZE = 2000
+
+CHANGE_FIELDS = ('id', 'news_id', 'channel_id', 'is_post', 'is_skipped', 'post_time', 'updated_at', 'version',
+                 'url_image', 'ai_text', 'pars_text', 'has_image')
+
+
+def parse_cursor(cursor):
+    if not cursor:
+        return 0, 0
+    version, _, pk = cursor.partition(':')
+    return int(version), int(pk)
+
+
+def visible_version_limit():
+    # version - это txid транзакции, записавшей строку. Транзакции с txid меньше xmin текущего
+    # снимка уже завершены, поэтому строк с такими версиями больше не появится. Всё, что выше,
+    # отдаём в следующих запросах: иначе долгая транзакция закоммитит версию позади курсора клиента.
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT txid_snapshot_xmin(txid_current_snapshot())')
+        return cursor.fetchone()[0]
+
+
+def after_cursor(queryset, version, pk, pk_field, version_field='version'):
+    # Сравнение строк (version, id) > (v, pk), а не OR из двух условий: так PostgreSQL начинает
+    # чтение индекса (version, id) прямо с курсора и останавливается после limit строк
+    meta = queryset.model._meta
+    qn = connection.ops.quote_name
+    table = qn(meta.db_table)
+    columns = f'{table}.{qn(meta.get_field(version_field).column)}, {table}.{qn(meta.get_field(pk_field).column)}'
+    return queryset.filter(RawSQL(f'({columns}) > (%s, %s)', (version, pk), output_field=BooleanField()))
+
+
+def changes_since(cursor=None, limit=CHANGES_PAGE_SIZE, channel_ids=None):
+    """
+    Изменения post_news после курсора "version:id" в порядке (version, id), без байтов картинок.
+
+    Возвращает {"changes": [...], "deleted": [...], "cursor": "...", "has_more": bool}.
+    Клиент сохраняет cursor и передаёт его в следующий вызов; пустой курсор - полная выгрузка.
+    Пост, изменённый несколько раз, приходит один раз с последней версией.
+    """
+    version, pk = parse_cursor(cursor)
+    limit = max(1, min(limit, CHANGES_MAX_PAGE_SIZE))
+    visible_limit = visible_version_limit()
+
+    changes = PostNews.objects.annotate(
+        has_image=ExpressionWrapper(Q(image__isnull=False), output_field=BooleanField()),
+    )
+    changes = after_cursor(changes, version, pk, 'id')
+    deleted = after_cursor(PostNewsTombstone.objects.all(), version, pk, 'post_id')
+    if visible_limit is not None:
+        changes = changes.filter(version__lt=visible_limit)
+        deleted = deleted.filter(version__lt=visible_limit)
+    if channel_ids is not None:
+        changes = changes.filter(channel_id__in=channel_ids)
+        deleted = deleted.filter(channel_tg_id__in=channel_ids)
+
+    # Оба потока читаются по индексу (version, id) не дальше limit + 1 строк и сливаются
+    changes = list(changes.order_by('version', 'id').values(*CHANGE_FIELDS)[:limit + 1])
+    deleted = list(
+        deleted.order_by('version', 'post_id')
+        .values('post_id', 'channel_tg_id', 'version', 'deleted_at')[:limit + 1]
+    )
+    merged = sorted(
+        [((row['version'], row['id']), 'changes', row) for row in changes]
+        + [((row['version'], row['post_id']), 'deleted', row) for row in deleted],
+        key=lambda item: item[0],
+    )
+
+    page = {'changes': [], 'deleted': [], 'cursor': f'{version}:{pk}', 'has_more': len(merged) > limit}
+    for key, kind, row in merged[:limit]:
+        page[kind].append(row)
+        page['cursor'] = f'{key[0]}:{key[1]}'
+    if not page['has_more'] and visible_limit is not None and (visible_limit, 0) > parse_cursor(page['cursor']):
+        # Все версии ниже границы просмотрены: курсор можно сдвинуть к ней, даже если подходящих строк
+        # не нашлось, иначе клиенты с фильтром по каналам перечитывали бы одни и те же чужие изменения
+        page['cursor'] = f'{visible_limit}:0'
+    return page
+
+
+def _has_sync_token(request):
+    token = getattr(settings, 'SYNC_API_TOKEN', None)
+    auth = request.META.get('HTTP_AUTHORIZATION', '')
+    if not token or not auth.startswith('Bearer '):
+        return False
+    return hmac.compare_digest(auth[len('Bearer '):].encode(), token.encode())
+
+
+def changes(request):
+    # GET /news/changes/?cursor=<version:id>&limit=<n>
+    # Для бота и аналитики по токену SYNC_API_TOKEN, для сотрудников - по сессии админки
+    by_token = _has_sync_token(request)
+    if not by_token and not (request.user.is_active and request.user.is_staff):
+        return HttpResponseForbidden()
+    try:
+        cursor = request.GET.get('cursor')
+        parse_cursor(cursor)
+        limit = int(request.GET.get('limit', CHANGES_PAGE_SIZE))
+    except ValueError:
+        return HttpResponseBadRequest('cursor должен быть вида "version:id", limit - числом')
+
+    channel_ids = None
+    if not by_token:
+        allowed = allowed_channel_ids(request.user)
+        channel_ids = list(allowed) if allowed is not None else None
+    return JsonResponse(changes_since(cursor, limit, channel_ids), json_dumps_params={'ensure_ascii': False})